@@ -0,0 +1,232 @@
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import xml_handler
+import eventgen
+import sinks
+import templates
+from mock_server import MockCollector
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows, peak RSS is reported as None there
+    resource = None
+
+SAMPLES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "samples", "audit_log.txt")
+
+def peak_rss_kb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak // 1024 if sys.platform == "darwin" else peak
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(fraction * len(sorted_values)))
+    return sorted_values[index]
+
+def summarize(events, total_bytes, seconds, latencies_ns=None):
+    result = {
+        "events": events,
+        "bytes": total_bytes,
+        "seconds": seconds,
+        "events_per_sec": events / seconds if seconds > 0 else 0.0,
+        "bytes_per_sec": total_bytes / seconds if seconds > 0 else 0.0,
+        "p50_us": None,
+        "p99_us": None
+    }
+
+    if latencies_ns:
+        latencies_ns.sort()
+        result["p50_us"] = percentile(latencies_ns, 0.50) / 1000
+        result["p99_us"] = percentile(latencies_ns, 0.99) / 1000
+
+    return result
+
+def time_calls(function, arguments, size=None):
+    """
+    Call `function` once per item of `arguments` and time every call.
+
+    Args:
+        function (callable): The function under test.
+        arguments (list): One argument per call.
+        size (callable): Returns the size in bytes of a call's result.
+
+    Returns:
+        dict: Throughput and latency figures.
+    """
+    latencies = []
+    total_bytes = 0
+    clock = time.perf_counter_ns
+
+    start = clock()
+    for argument in arguments:
+        before = clock()
+        result = function(argument)
+        latencies.append(clock() - before)
+        if size is not None:
+            total_bytes += size(result)
+    seconds = (clock() - start) / 1e9
+
+    return summarize(len(arguments), total_bytes, seconds, latencies)
+
+def write_corpus(path, records):
+    # A synthetic corpus made of repeated copies of the bundled samples
+    with open(SAMPLES, 'r') as f:
+        text = f.read().rstrip("\n") + "\n\n"
+    copies = max(1, records // text.count("TIMESTAMP:"))
+
+    with open(path, 'w') as f:
+        for _ in range(copies):
+            f.write(text)
+
+def bench_parse(path, repeat):
+    size = os.path.getsize(path)
+    events = 0
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        events += len(xml_handler.parse_audit_log(path))
+    seconds = time.perf_counter() - start
+
+    return summarize(events, size * repeat, seconds)
+
+def bench_dispatch(events, count):
+    # The mock collector accepts every POST, like the real one on a good day
+    port = MockCollector(token="benchmark").start_in_thread()
+
+    config = {"webhook_url": f"http://127.0.0.1:{port}/services/collector/raw",
+              "auth_token": "benchmark"}
+    sink = sinks.create_sink(config)
+    arguments = [events[index % len(events)] for index in range(count)]
+
+    # Latency is what the producer pays per call, throughput includes delivery
+    start = time.perf_counter()
+    result = time_calls(lambda event: eventgen.dispatch_event(event, sink), arguments)
+    sink.close()
+    seconds = time.perf_counter() - start
+
+    total_bytes = sum(len(event.encode('utf-8')) for event in arguments)
+    delivered = sum(stats["events"] for stats in sink.stats)
+    throughput = summarize(delivered, total_bytes, seconds)
+    throughput["p50_us"], throughput["p99_us"] = result["p50_us"], result["p99_us"]
+    return throughput
+
+def run(iterations, corpus_records, dispatch_events):
+    config = {"timezone": xml_handler.DEFAULT_TIMEZONE}
+    samples = xml_handler.parse_audit_log(SAMPLES)
+    records = [samples[index % len(samples)] for index in range(iterations)]
+    encoded_size = lambda text: len(text.encode('utf-8'))
+
+    results = {}
+    results["parse_audit_log_small"] = bench_parse(SAMPLES, max(1, iterations // 100))
+
+    with tempfile.TemporaryDirectory() as directory:
+        corpus = os.path.join(directory, "audit_log.txt")
+        write_corpus(corpus, corpus_records)
+        results["parse_audit_log_large"] = bench_parse(corpus, 1)
+
+    results["generate_event"] = time_calls(lambda sample: eventgen.generate_event(sample, config),
+                                           records, encoded_size)
+
+    json_events = [eventgen.generate_event(record, config) for record in records]
+    results["json_to_xml"] = time_calls(
+        lambda event: xml_handler.json_to_xml(xml_handler.process_json_input(event)), json_events)
+
+    elements = [xml_handler.json_to_xml(xml_handler.process_json_input(event))
+                for event in json_events[:max(1, iterations // 10)]]
+    results["prettify_xml"] = time_calls(xml_handler.prettify_xml, elements, encoded_size)
+
+    results["calculate_average_event_size"] = time_calls(
+        eventgen.calculate_average_event_size, [samples] * max(1, iterations // 100))
+
+    timestamp = xml_handler.get_current_timestamp()
+    compiled = templates.compile_templates(samples, "xml")
+    results["template_render_xml"] = time_calls(
+        lambda template: template.render((timestamp,)),
+        [compiled[index % len(compiled)] for index in range(iterations)], encoded_size)
+
+    xml_events = [compiled[index % len(compiled)].render((timestamp,)) for index in range(len(compiled))]
+    results["dispatch_event"] = bench_dispatch(xml_events, dispatch_events)
+
+    return results
+
+def compare(results, baseline, threshold):
+    """
+    Find benchmarks whose throughput dropped by more than `threshold`
+    percent against a baseline run.
+
+    Returns:
+        list: One message per regression.
+    """
+    regressions = []
+    for name, result in results.items():
+        previous = baseline.get("results", {}).get(name)
+        if not previous or not previous["events_per_sec"]:
+            continue
+
+        change = (result["events_per_sec"] - previous["events_per_sec"]) / previous["events_per_sec"] * 100
+        if change < -threshold:
+            regressions.append(f"{name}: {result['events_per_sec']:.0f} events/s, "
+                               f"{change:+.1f}% against {previous['events_per_sec']:.0f} events/s")
+    return regressions
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark the event generator hot path.")
+    parser.add_argument("--iterations", type=int, default=20000, help="Calls per micro-benchmark.")
+    parser.add_argument("--corpus-records", type=int, default=100000, help="Records in the large parse corpus.")
+    parser.add_argument("--dispatch-events", type=int, default=5000, help="Events sent to the HTTP stand-in.")
+    parser.add_argument("--output", help="Write the results to this JSON file.")
+    parser.add_argument("--baseline", help="Results of an earlier run to compare against.")
+    parser.add_argument("--threshold", type=float, default=10.0,
+                        help="Fail when throughput drops by more than this percentage.")
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    results = run(args.iterations, args.corpus_records, args.dispatch_events)
+
+    for name, result in results.items():
+        line = f"{name}: {result['events_per_sec']:.0f} events/s"
+        if result["bytes"]:
+            line += f", {result['bytes_per_sec'] / 1024**2:.2f} MB/s"
+        if result["p50_us"] is not None:
+            line += f", p50 {result['p50_us']:.1f} us, p99 {result['p99_us']:.1f} us"
+        print(line)
+    # The peak of the whole process, so it is only meaningful for the run as a whole
+    peak_rss = peak_rss_kb()
+    print(f"Peak RSS: {peak_rss} KB")
+
+    report = {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S%z")
+        },
+        "peak_rss_kb": peak_rss,
+        "results": results
+    }
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, 'r') as f:
+            baseline = json.load(f)
+
+        regressions = compare(results, baseline, args.threshold)
+        for regression in regressions:
+            print(f"Regression: {regression}")
+        if regressions:
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+import json
+import os
+
+# Settings read from the environment, never written to a checkpoint
+SECRETS = ("auth_token",)
+
+def without_secrets(config):
+    # The config as it may be written to disk
+    return {key: value for key, value in config.items() if key not in SECRETS}
+
+def config_key(config):
+    """
+    The settings a checkpoint must have been written with to be resumed.
+    Seeds are left out: a run without one is resumed with the seed it
+    drew, and workers draw theirs at every start. Secrets are left out
+    too, they may change between runs.
+
+    Returns:
+        dict: The config without its seeds and secrets.
+    """
+    settings = {key: value for key, value in without_secrets(config).items() if key not in ("seed", "resume")}
+    if isinstance(settings.get("profile"), dict):
+        settings["profile"] = {key: value for key, value in settings["profile"].items() if key != "seed"}
+    return settings
+
+def encode_rng(state):
+    # random.Random.getstate() as JSON: version, 625 ints and the cached gauss value
+    version, internal, gauss = state
+    return [version, list(internal), gauss]
+
+def decode_rng(state):
+    version, internal, gauss = state
+    return version, tuple(internal), gauss
+
+def save_checkpoint(path, state):
+    """
+    Write a checkpoint atomically: to a temporary file first, synced to
+    disk and moved into place, so a crash leaves either the previous
+    checkpoint or this one.
+
+    Args:
+        path (str): Path of the checkpoint file.
+        state (dict): Everything needed to continue the run.
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, 'w') as f:
+        json.dump(state, f, separators=(',', ':'))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, path)
+
+def load_checkpoint(path, config):
+    """
+    Read the checkpoint of a run.
+
+    Args:
+        path (str): Path of the checkpoint file.
+        config (dict): Configuration the run is resumed with.
+
+    Returns:
+        dict: The checkpoint, None when the run never wrote one.
+
+    Raises:
+        ValueError: When the checkpoint belongs to a different configuration.
+    """
+    if not os.path.exists(path):
+        return None
+
+    with open(path, 'r') as f:
+        state = json.load(f)
+
+    if config_key(state["config"]) != config_key(config):
+        raise ValueError(f"Invalid checkpoint {path}. It was written with a different configuration.")
+    return state
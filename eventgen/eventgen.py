@@ -1,11 +1,35 @@
+import argparse
+import functools
 import json
 import os
-import requests
 import random
+import sys
 import time
 import xml.etree.ElementTree as ET
-from datetime import datetime as dt, timezone
+from datetime import datetime
+import pytz
 import xml_handler
+import parsers
+import sinks
+from scheduler import RateScheduler, ProfileScheduler, BackfillScheduler
+import profiles
+import templates
+import sample_cache
+import synth
+import sessions
+import statements
+import checkpoints
+from metrics import Metrics
+from sender import COMPRESSORS
+
+# Number of events whose fields are synthesized per call
+SYNTH_CHUNK = 4096
+
+# Content type of the events of each output format
+CONTENT_TYPES = {"json": "application/json", "xml": "application/xml"}
+
+# Bytes of sample events compressed at startup to estimate a wire budget
+ESTIMATE_BYTES = 256 * 1024
 
 # Load configuration from config.json
 def load_config(file_path='config.json'):
@@ -32,70 +56,147 @@ def load_config(file_path='config.json'):
 def generate_event(sample, config):
     event = sample.copy()
 
-    # Real-time UTC date
-    date = dt.now(timezone.utc)
-    unix_time = date.timestamp()
-
     # Refactor data properties from event sample
-    event["timestamp"] = xml_handler.get_current_timestamp()
+    event["timestamp"] = xml_handler.get_current_timestamp(config.get("timezone", xml_handler.DEFAULT_TIMEZONE))
     
     # Convert the dictionary to a JSON string
     final_event = json.dumps(event)
 
     return final_event
 
-def dispatch_event(event, config):
-    # Define the webhook URL where the data will be sent
-    webhook_url = config["webhook_url"]
-    
+def serialize_event(event):
+    """
+    Turn an event into the string that goes on the wire.
+
+    Args:
+        event (dict | ET.Element | str): The event to serialize.
+
+    Returns:
+        tuple: The serialized event and its content type.
+    """
     # Determine the payload format (JSON or XML)
     if isinstance(event, dict):
         # The event is in JSON format (dictionary)
-        headers = {
-            'Content-Type': 'application/json',
-            'Authorization': f'Bearer {config["auth_token"]}'
-        }
-        # Convert the event to a JSON string
-        event_data = json.dumps(event)
+        return json.dumps(event), 'application/json'
     elif isinstance(event, ET.Element):
         # The event is in XML format (ElementTree element)
-        headers = {
-            'Content-Type': 'application/xml',
-            'Authorization': f'Bearer {config["auth_token"]}'
-        }
-        # Convert the XML event to a string
-        event_data = ET.tostring(event, encoding='utf-8', method='xml').decode('utf-8')
+        return ET.tostring(event, encoding='utf-8', method='xml').decode('utf-8'), 'application/xml'
     elif isinstance(event, str):
         # The event is a pre-serialized string (assume it's either JSON or XML)
         if event.strip().startswith("<"):
             # It's likely XML
-            headers = {
-                'Content-Type': 'application/xml',
-                'Authorization': f'Bearer {config["auth_token"]}'
-            }
-        else:
-            # It's likely JSON
-            headers = {
-                'Content-Type': 'application/json',
-                'Authorization': f'Bearer {config["auth_token"]}'
-            }
-        # Use the string as-is for the request
-        event_data = event
+            return event, 'application/xml'
+        # It's likely JSON
+        return event, 'application/json'
     else:
         raise ValueError("Unsupported event format. Must be a dict (JSON), ElementTree.Element (XML), or string.")
 
-    # Send the data to the webhook URL using an HTTP POST request
-    response = requests.post(webhook_url, headers=headers, data=event_data)
+def dispatch_event(event, sink, content_type=None):
+    # Serialized events of a known content type go out as they are
+    if content_type is None:
+        event, content_type = serialize_event(event)
 
-    # Check if the request was successful
-    if response.status_code != 200:
-        print(f"Failed to send data. Status code: {response.status_code}")
-    else:
-        print(f"Data successfully sent. Status code: {response.status_code}")
+    # Hand the event over to the output sink
+    sink.write([event], content_type)
+
+class EventBatch:
+    """
+    Buffer of serialized events that are sent together as one
+    newline-delimited request body.
+
+    A batch is due for a flush once it holds max_events events,
+    max_bytes bytes, or its oldest event is max_age seconds old.
+    """
+
+    def __init__(self, max_events=500, max_bytes=1024**2, max_age=5.0):
+        self.max_events = max_events
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.events = []
+        self.size = 0
+        self.content_type = None
+        self.started = None
+
+    def add(self, event, size=None, content_type=None):
+        """
+        Add an event to the batch.
+
+        Args:
+            event (dict | ET.Element | str): The event.
+            size (int): Bytes of the serialized event, measured when not given.
+            content_type (str): Content type of an already serialized event,
+                the event is serialized and its type detected when not given.
+        """
+        event_data = event
+        if content_type is None:
+            event_data, content_type = serialize_event(event)
+        if size is None:
+            size = len(event_data.encode('utf-8'))
+
+        if not self.events:
+            self.content_type = content_type
+            self.started = time.monotonic()
+        else:
+            # Account for the newline that separates events in the body
+            self.size += 1
+
+        self.events.append(event_data)
+        self.size += size
+
+    def deadline(self):
+        # Monotonic time by which the batch is due because of its age, None when empty
+        return self.started + self.max_age if self.events else None
+
+    def should_flush(self):
+        if not self.events:
+            return False
+
+        return (len(self.events) >= self.max_events
+                or self.size >= self.max_bytes
+                or time.monotonic() - self.started >= self.max_age)
+
+    def drain(self):
+        events = self.events
+        content_type = self.content_type
+
+        self.events = []
+        self.size = 0
+        self.content_type = None
+        self.started = None
+
+        return events, content_type
+
+def dispatch_batch(batch, sink):
+    events, content_type = batch.drain()
+
+    # Send all buffered events to the sink in one go
+    sink.write(events, content_type)
+
+def batch_sleep(batch, sink):
+    """
+    A sleep for the schedulers that sends the batch out as soon as it
+    reaches max_age, instead of when the next event is added, so slow
+    rates do not hold events back for longer than max_age.
+
+    Returns:
+        callable: Sleeps for the given number of seconds.
+    """
+    def sleep(seconds):
+        wake = time.monotonic() + seconds
+        deadline = batch.deadline()
+        if deadline is not None and deadline < wake:
+            time.sleep(max(0.0, deadline - time.monotonic()))
+            dispatch_batch(batch, sink)
+        time.sleep(max(0.0, wake - time.monotonic()))
+
+    return sleep
 
 def parse_size(size_str):
-    units = {"B": 1, "KB": 1024, "MB": 1024**2, "GB": 1024**3, "PB": 1024**4}
+    units = {"B": 1, "KB": 1024, "MB": 1024**2, "GB": 1024**3, "TB": 1024**4, "PB": 1024**5}
     size, unit = size_str[:-2], size_str[-2:]
+    # Plain byte counts such as "512B" have a one letter unit
+    if not unit.isalpha():
+        size, unit = size_str[:-1], size_str[-1:]
     return int(size) * units[unit]
 
 def parse_time_range(time_range):
@@ -110,6 +211,13 @@ def parse_time_range(time_range):
     
     return number * time_units[unit]
 
+def parse_datetime(value, timezone_name):
+    # ISO 8601 date and time, in the given timezone unless it has an offset
+    moment = datetime.fromisoformat(value)
+    if moment.tzinfo is None:
+        moment = pytz.timezone(timezone_name).localize(moment)
+    return moment.timestamp()
+
 def calculate_average_event_size(events):
     total_size = 0
 
@@ -135,20 +243,198 @@ def calculate_average_event_size(events):
     average_size = total_size / len(events) if events else 0
     return average_size
 
-def generate_events(config):
+def load_samples(config, rng=random):
+    """
+    Load the sample records.
+
+    The samples are an audit file or a directory of .aud files, parsed
+    in parallel, in the format given by "sample_format" or detected
+    from each file. With a "sample_cache" directory configured, the
+    records come from a persistent cache that is rebuilt whenever the
+    samples change. Cached samples also keep their compiled templates.
+
+    Args:
+        config (dict): Configuration settings.
+        rng (random.Random): Source of randomness for the sample subset.
+
+    Returns:
+        list | CachedSamples: The sample records.
+    """
+    limit = config.get("sample_limit")
+    sample_format = config.get("sample_format", "auto")
+    workers = config.get("parser_workers")
+
+    if not config.get("sample_cache"):
+        # Large corpora are replayed from a random subset of their records
+        if limit:
+            return parsers.sample_path(config["samples"], limit, sample_format, workers, rng)
+        return parsers.parse_path(config["samples"], sample_format, workers)
+
+    # The cache stays open, records are decoded and templates read from it as they are needed
+    cache = sample_cache.open_cache(config["samples"], config["sample_cache"], sample_format, workers)
+    if limit and limit < len(cache):
+        indices = sorted(rng.sample(range(len(cache)), limit))
+    else:
+        indices = range(len(cache))
+
+    return sample_cache.CachedSamples(cache, indices)
+
+def status_stream(config):
+    # Keep status messages out of the event stream when events go to stdout
+    if config.get("sink", {}).get("type") == "stdout":
+        return sys.stderr
+    return sys.stdout
+
+def print_progress(event_count, total_bytes, elapsed_minutes, file=None):
+    print(f"Sent {event_count} events, {total_bytes} bytes in {int(elapsed_minutes)} minute(s).", file=file)
+
+def generate_events(config, progress=print_progress):
+    # Optional checkpoints, and a run resumed from the last one with the settings it started with
+    checkpoint_config = config.get("checkpoint")
+    state = None
+    if config.get("resume"):
+      if not checkpoint_config:
+        raise ValueError("Invalid resume. Configure a 'checkpoint' section to resume from.")
+      state = checkpoints.load_checkpoint(checkpoint_config["path"], config)
+      if state is not None:
+        # Secrets are not in the checkpoint, they come from the environment of this run
+        config = dict(state["config"], **{key: config[key] for key in checkpoints.SECRETS if key in config})
+
+    # Every random choice comes from one generator, so a seed reproduces the run.
+    # Each worker process seeds its own, a run without a seed draws one to resume with.
+    if "seed" not in config:
+      config = dict(config, seed=random.randrange(2**32))
+    config = {key: value for key, value in config.items() if key != "resume"}
+    rng = random.Random(config["seed"])
+
     # Use the sample events to rehydrate new events in the future
 
-    if (config["format"] == "json"):
-      events = xml_handler.parse_audit_log(config["samples"])
-    elif (config["format"] == "xml"):
-      events = xml_handler.parse_audit_log(config["samples"])
+    events = load_samples(config, rng)
+
+    escape = templates.escape_json if config["format"] == "json" else templates.escape_xml
+    fields = ("timestamp",)
+
+    # Optional sessions that log on, run statements and log off
+    simulator = None
+    session_events = []
+    if config.get("sessions"):
+      simulator = sessions.create_simulator(config["sessions"], events, escape, rng)
+      # Logon and logoff come first in template order
+      session_events = sessions.session_records(events[0])
+      fields += sessions.SESSION_FIELDS
+
+    # Optional SQL statements whose literals are filled with fresh values per event
+    statement_engine = None
+    if config.get("statements"):
+      statement_engine = statements.StatementEngine(session_events + list(events), escape, config["statements"], rng)
+      if statement_engine.field in fields:
+        raise ValueError(f"Invalid statements field. {statement_engine.field} is already set per event.")
+      fields += (statement_engine.field,)
+
+    # Fields drawn from the distributions declared in the config
+    synthesizer = None
+    if config.get("fields"):
+      synthesizer = synth.Synthesizer(config["fields"], escape, rng)
+      collisions = sorted(set(synthesizer.fields) & set(fields))
+      if collisions:
+        raise ValueError(f"Invalid fields. {', '.join(collisions)} are already set per event.")
+      fields += synthesizer.fields
+
+    # Serialize every sample once, only the slot fields change per event
+    event_templates = (templates.compile_templates(session_events, config["format"], fields)
+                       + templates.compile_templates(events, config["format"], fields))
+    # Every event is charged the exact size of its static part in the output format
+    event_charges = [template.size for template in event_templates]
+    content_type = CONTENT_TYPES[config["format"]]
+
+    # Resolve the timezone once for the whole run
+    timezone = config.get("timezone", xml_handler.DEFAULT_TIMEZONE)
+    timestamps = xml_handler.TimestampSource(timezone)
 
     byte_limit = parse_size(config['output_size'])
-    total_time_seconds = parse_time_range(config["time_range"])
 
-    average_event_size = calculate_average_event_size(events)
-    estimated_events = byte_limit // average_event_size
-    delay_per_event = total_time_seconds / estimated_events if estimated_events > 0 else 0
+    # A backfill spreads the events over a past window, without pacing
+    backfill = config.get("backfill")
+    window_start = None
+    if backfill:
+      window_start = parse_datetime(backfill["start"], timezone)
+      total_time_seconds = parse_datetime(backfill["end"], timezone) - window_start
+      if total_time_seconds <= 0:
+        raise ValueError("Invalid backfill window. The end must come after the start.")
+    else:
+      total_time_seconds = parse_time_range(config["time_range"])
+
+    # Count logical bytes against the budget, or estimate the bytes on the wire
+    budget = config.get("budget", "logical")
+    if budget not in ("logical", "wire"):
+      raise ValueError("Invalid budget. Use 'logical' or 'wire'.")
+
+    rows = []
+    steps = []
+    value_size = len
+    # Escaped values are pure ASCII unless a distribution or user name says otherwise
+    if ((synthesizer is not None and not synthesizer.ascii) or (simulator is not None and not simulator.ascii)
+        or (statement_engine is not None and not statement_engine.ascii)):
+      value_size = lambda value: len(value.encode('utf-8'))
+
+    sample_timestamp = timestamps.format(int(time.time() * 1000000))
+    if simulator is None:
+      average_event_size = sum(event_charges) / len(event_charges) + len(sample_timestamp)
+    else:
+      # Logons and logoffs are drawn as often as the sessions turn over
+      steps = simulator.tick(SYNTH_CHUNK)
+      steps.reverse()
+      average_event_size = len(sample_timestamp) + sum(
+        event_charges[index] + sum(value_size(value) for value in values) for index, values in steps) / len(steps)
+    if synthesizer is not None:
+      rows = synthesizer.rows(SYNTH_CHUNK)
+      rows.reverse()
+      average_event_size += sum(value_size(value) for row in rows for value in row) / len(rows)
+    if statement_engine is not None:
+      average_event_size += statement_engine.average_size(value_size)
+
+    # Stream sinks end every event with a newline, batches separate them with one
+    terminated = config.get("sink", {}).get("type", "http") != "http"
+    if terminated or config.get("batch"):
+      average_event_size += 1
+
+    # With a wire budget, the logical limit follows the compression ratio: estimated
+    # from sample events at startup, then from what the sink has sent as well
+    logical_limit = byte_limit
+    if budget == "wire":
+      sample_body, sample_wire = estimate_compression(config, events, timestamps)
+      logical_limit = byte_limit * sample_body / sample_wire
+
+    if state is not None:
+      # The estimates of the interrupted run, not ones from the chunk drawn above
+      average_event_size = state["average_event_size"]
+      logical_limit = state["logical_limit"]
+    estimated_events = logical_limit // average_event_size
+
+    # Pace either events or bytes per second against the schedule
+    scheduler_config = dict(config.get("scheduler", {}))
+    rate_unit = scheduler_config.pop("unit", "bytes")
+    if rate_unit == "events":
+      scheduled_total = estimated_events
+    elif rate_unit == "bytes":
+      scheduled_total = logical_limit
+    else:
+      raise ValueError("Invalid scheduler unit. Use 'events' or 'bytes'.")
+
+    # A load profile shapes the rate over the time range, by default it is flat.
+    # A resumed live run places it so the profile goes on from where it stopped.
+    profile_start = window_start
+    if state is not None and not backfill:
+      profile_start = time.time() - state["scheduler"]["elapsed"]
+    profile = profiles.create_profile(config, total_time_seconds, start=profile_start, rng=rng)
+    if backfill:
+      scheduler = BackfillScheduler(scheduled_total, total_time_seconds, window_start, profile)
+      # Stamp events with the simulated time instead of the wall clock
+      timestamps.clock = scheduler.clock
+    elif profile is None:
+      scheduler = RateScheduler(scheduled_total / total_time_seconds, **scheduler_config)
+    else:
+      scheduler = ProfileScheduler(profile, scheduled_total, **scheduler_config)
 
     # Timing measurement
     start_time = time.time()
@@ -161,31 +447,320 @@ def generate_events(config):
     # Loop control
     total_bytes = 0
 
-    while total_bytes < byte_limit:
-      sample = random.choice(events)
-      event = generate_event(sample, config)
-      total_bytes += len(event.encode())
-      
-      if (config["format"] == "xml"):
-        event = xml_handler.json_to_xml(xml_handler.process_json_input(event))
+    # Optional batching of several events per request
+    batch = EventBatch(**config["batch"]) if config.get("batch") else None
+
+    # Optional metrics snapshots, Prometheus endpoint and stage profiling
+    metrics = Metrics(**config["metrics"]) if config.get("metrics") else None
+    profiler = metrics.profiler if metrics is not None else None
+    last_metrics_time = start_time
+
+    # Where the events go, by default the webhook URL over HTTP
+    sink = sinks.create_sink(config, metrics)
+    if batch is not None:
+      scheduler.sleep = batch_sleep(batch, sink)
+
+    if metrics is not None:
+      metrics.counter("eventgen_wire_bytes_total", "Bytes that went out on the wire.",
+                      function=lambda: sum(sink_stats["wire_bytes"] for sink_stats in sink.stats))
+      metrics.gauge("eventgen_scheduler_drift_percent", "Actual against target rate, in percent.",
+                    function=lambda: scheduler.drift()["drift_pct"])
+
+    last_budget_time = start_time
+
+    def snapshot():
+      return {
+          "config": checkpoints.without_secrets(config),
+          "rng": checkpoints.encode_rng(rng.getstate()),
+          "events": event_count,
+          "bytes": total_bytes,
+          "logical_limit": logical_limit,
+          "average_event_size": average_event_size,
+          "elapsed": time.time() - start_time,
+          "timestamp": timestamps.last,
+          "rows": rows,
+          "steps": steps,
+          "sessions": simulator.state() if simulator is not None else None,
+          "statements": statement_engine.state() if statement_engine is not None else None,
+          "scheduler": scheduler.state(),
+          "sink": sink.checkpoint()
+      }
+
+    if state is not None:
+      # Pick up every counter, buffer and position where the checkpoint left them
+      rng.setstate(checkpoints.decode_rng(state["rng"]))
+      event_count = state["events"]
+      total_bytes = state["bytes"]
+      start_time = time.time() - state["elapsed"]
+      timestamps.last = state["timestamp"]
+      rows = [tuple(row) for row in state["rows"]]
+      steps = [(index, tuple(values)) for index, values in state["steps"]]
+      if simulator is not None:
+        simulator.restore(state["sessions"])
+      if statement_engine is not None:
+        statement_engine.restore(state["statements"])
+      scheduler.restore(state["scheduler"])
+      sink.restore(state["sink"])
+
+    checkpoint_path = None
+    if checkpoint_config:
+      checkpoint_path = checkpoint_config["path"]
+      checkpoint_interval = checkpoint_config.get("interval", 10.0)
+      last_checkpoint_time = time.time()
+
+    while total_bytes < logical_limit:
+      if profiler is not None:
+        profiler.start()
+
+      if simulator is None:
+        index = rng.randrange(len(event_templates))
+      else:
+        # Sessions are advanced a chunk of events at a time
+        if not steps:
+          steps = simulator.tick(SYNTH_CHUNK)
+          steps.reverse()
+        index, session_values = steps.pop()
+      if profiler is not None:
+        profiler.lap("pick")
+
+      timestamp = timestamps.now()
+      if profiler is not None:
+        profiler.lap("timestamp")
+
+      if synthesizer is None and simulator is None and statement_engine is None:
+        event = event_templates[index].render((timestamp,))
+        event_size = event_charges[index] + len(timestamp)
+      else:
+        values = (timestamp,)
+        if simulator is not None:
+          values += session_values
+        if statement_engine is not None:
+          values += (statement_engine.render(index),)
+        if synthesizer is not None:
+          # Field values are synthesized a chunk of events at a time
+          if not rows:
+            rows = synthesizer.rows(SYNTH_CHUNK)
+            rows.reverse()
+          values += rows.pop()
+        event = event_templates[index].render(values)
+        event_size = event_charges[index] + sum(value_size(value) for value in values)
+
+      # Charge the newline in front of every batched event but the first
+      separator = 1 if terminated or (batch is not None and batch.events) else 0
+      total_bytes += event_size + separator
+      if profiler is not None:
+        profiler.lap("serialize")
 
       event_count += 1
       current_time = time.time()
 
-      dispatch_event(event, config)
-      time.sleep(delay_per_event)
+      if batch is None:
+        dispatch_event(event, sink, content_type)
+      else:
+        batch.add(event, event_size, content_type)
+        if batch.should_flush():
+          dispatch_batch(batch, sink)
+      if profiler is not None:
+        profiler.lap("dispatch")
+
+      scheduler.acquire(event_size + separator if rate_unit == "bytes" else 1)
+
+      # Publish the running totals once a second, not on every event
+      if metrics is not None and current_time - last_metrics_time >= 1:
+        last_metrics_time = current_time
+        metrics.events.set_total(event_count)
+        metrics.bytes.set_total(total_bytes)
+
+      if budget == "wire" and current_time - last_budget_time >= 1:
+        last_budget_time = current_time
+        totals = sink_totals(sink)
+        logical_limit = byte_limit * (sample_body + totals["body_bytes"]) / (sample_wire + totals["wire_bytes"])
+        if backfill or profile is not None:
+          # Backfill and profile schedules place the whole budget over the time range
+          rate = logical_limit / total_time_seconds
+        else:
+          # A flat rate spreads what is left of the budget over the time that is left
+          remaining_time = max(total_time_seconds - (current_time - start_time), 1.0)
+          rate = max(logical_limit - total_bytes, 0) / remaining_time
+        scheduler.set_rate(rate if rate_unit == "bytes" else rate / average_event_size)
+
+      # The batch goes out first, so the checkpoint covers every event counted so far
+      if checkpoint_path is not None and current_time - last_checkpoint_time >= checkpoint_interval:
+        last_checkpoint_time = current_time
+        if batch is not None and batch.events:
+          dispatch_batch(batch, sink)
+        checkpoints.save_checkpoint(checkpoint_path, snapshot())
 
       if current_time - last_print_time >= 60:
         elapsed_time = current_time - start_time
         elapsed_minutes = elapsed_time // 60
         last_print_time = current_time
-    
-      print(f"Sent {event_count} events, {total_bytes} bytes in {int(elapsed_minutes)} minute(s).")
+        progress(event_count, total_bytes, elapsed_minutes)
+
+    elapsed_minutes = (time.time() - start_time) // 60
+    progress(event_count, total_bytes, elapsed_minutes)
+
+    # Send whatever is left in the buffer
+    if batch is not None and batch.events:
+      dispatch_batch(batch, sink)
+
+    # A finished run resumes to nothing left to do
+    if checkpoint_path is not None:
+      checkpoints.save_checkpoint(checkpoint_path, snapshot())
 
+    sink.close()
+
+    drift = scheduler.drift()
+
+    stage_profile = None
+    if metrics is not None:
+      metrics.events.set_total(event_count)
+      metrics.bytes.set_total(total_bytes)
+      stage_profile = metrics.close().get("profile")
+
+    return {
+        "events": event_count,
+        "bytes": total_bytes,
+        "unit": rate_unit,
+        "drift": drift,
+        **sink_totals(sink),
+        "spooled": sink.spooled(),
+        "label": sink.label,
+        "senders": sink.stats,
+        "profile": stage_profile
+    }
+
+def sink_totals(sink):
+    return {
+        "body_bytes": sum(sink_stats["bytes"] for sink_stats in sink.stats),
+        "wire_bytes": sum(sink_stats["wire_bytes"] for sink_stats in sink.stats)
+    }
+
+def estimate_compression(config, records, timestamps):
+    """
+    Compress sample events the way the sink will compress them, to
+    estimate the compression ratio of a run before anything is sent.
+
+    Args:
+        config (dict): Configuration settings.
+        records (list): Parsed sample records.
+        timestamps (TimestampSource): Formats the timestamps of the run.
+
+    Returns:
+        tuple: Body bytes and wire bytes of the sample, the same number
+        when the sink does not compress.
+    """
+    sink_config = config.get("sink", {})
+    kind = sink_config.get("type", "http")
+    if kind == "http":
+        sender_config = config.get("sender", {})
+        compress = COMPRESSORS[sender_config.get("compression")]
+        level = sender_config.get("compresslevel", 6)
+        # One request body per batch, or per event without batching
+        batch = EventBatch(**config["batch"]) if config.get("batch") else EventBatch(max_events=1)
+        body_events, body_bytes = batch.max_events, batch.max_bytes
+    elif kind == "file" and sink_config.get("compress"):
+        compress = COMPRESSORS["gzip"]
+        level = sink_config.get("compresslevel", 6)
+        # A gzip file is one stream
+        body_events, body_bytes = None, ESTIMATE_BYTES
+    else:
+        compress = None
+
+    if compress is None:
+        return 1, 1
+
+    # A fixed generator, so the estimate does not change the events of a seeded run.
+    # Fresh timestamps, a few milliseconds apart, compress like the ones of the run.
+    rng = random.Random(0)
+    moment = int(time.time() * 1000000)
+
+    total_body = total_wire = 0
+    while total_body < ESTIMATE_BYTES:
+        body = []
+        size = 0
+        while (body_events is None or len(body) < body_events) and size < body_bytes:
+            moment += rng.randrange(10000)
+            record = dict(rng.choice(records), timestamp=timestamps.format(moment))
+            event = templates.serialize_record(record, config["format"]).encode('utf-8')
+            body.append(event)
+            size += len(event) + 1
+        data = b"\n".join(body)
+        total_body += len(data)
+        total_wire += len(compress(data, level))
+
+    return total_body, total_wire
+
+def compression_ratio(stats):
+    # Sent body bytes per wire byte, 1.0 when nothing is compressed
+    return stats["body_bytes"] / stats["wire_bytes"] if stats["wire_bytes"] else 1.0
+
+def print_summary(stats, file=None):
+    drift = stats["drift"]
+    unit = stats["unit"]
+
+    print(f"Throughput: {drift['actual_rate']:.2f} {unit}/s "
+          f"(target {drift['target_rate']:.2f} {unit}/s, drift {drift['drift_pct']:+.2f}%).", file=file)
+
+    # Logical bytes count against output_size, wire bytes are what was sent
+    print(f"Bytes: {stats['bytes']} logical, {stats['wire_bytes']} on the wire "
+          f"({compression_ratio(stats):.2f}x compression).", file=file)
+
+    for index, sender_stats in enumerate(stats["senders"]):
+        print(f"{stats['label']} {index}: {sender_stats['requests']} requests ({sender_stats['events']} events) sent, "
+              f"{sender_stats['failed']} requests ({sender_stats['failed_events']} events) failed.", file=file)
+
+    if stats["spooled"]:
+        print(f"{stats['spooled']} events are left in the spool and will be sent on the next run.", file=file)
+
+    print_streams(stats.get("streams", []), file=file)
+
+    if stats["profile"]:
+        print_profile(stats["profile"], file=file)
+
+def print_streams(streams, file=None):
+    for stream in streams:
+        print(f"Stream {stream['name']}: {stream['events']} events, {stream['bytes']} bytes.", file=file)
+
+def print_profile(profile, file=None):
+    stages = profile["stages"]
+    total = sum(stage["seconds"] for stage in stages.values())
+
+    for name, stage in sorted(stages.items(), key=lambda item: -item[1]["seconds"]):
+        share = stage["seconds"] / total * 100 if total > 0 else 0.0
+        print(f"Stage {name}: {stage['seconds']:.3f} s over {stage['calls']} calls ({share:.1f}%).", file=file)
+
+    for allocation in profile["allocations"]:
+        print(f"Allocated {allocation['size_kb']:.1f} KB in {allocation['count']} blocks at "
+              f"{allocation['location']}.", file=file)
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Generate Oracle audit events.")
+    parser.add_argument("--config", default="config.json", help="Path to the JSON config file.")
+    parser.add_argument("--workers", type=int, default=1, help="Number of generator processes.")
+    parser.add_argument("--resume", action="store_true", help="Continue the run from its last checkpoint.")
+    return parser.parse_args()
 
 def main():
-    config = load_config()
-    generate_events(config)
+    args = parse_args()
+    config = load_config(args.config)
+    if args.resume:
+        config["resume"] = True
+
+    if args.workers > 1:
+        # Imported here because the worker module drives this one
+        import workers
+        workers.run_workers(config, args.workers)
+    elif config.get("streams"):
+        # Imported here because the streams module drives this one
+        import streams
+        stream = status_stream(config)
+        stats = streams.run_streams(config, progress=functools.partial(print_progress, file=stream))
+        print_summary(stats, file=stream)
+    else:
+        stream = status_stream(config)
+        stats = generate_events(config, progress=functools.partial(print_progress, file=stream))
+        print_summary(stats, file=stream)
 
 if __name__=="__main__":
     main()
@@ -0,0 +1,301 @@
+import http.server
+import json
+import threading
+import time
+import tracemalloc
+
+# Send latency buckets, upper bounds in seconds
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+class Counter:
+    """
+    Monotonic count, optionally split by one label.
+
+    Args:
+        name (str): Metric name.
+        help (str): One-line description.
+        label (str): Name of the label values are split by, if any.
+        function (callable): Returns the current value, for counts that
+            are kept elsewhere.
+    """
+
+    kind = "counter"
+
+    def __init__(self, name, help, label=None, function=None):
+        self.name = name
+        self.help = help
+        self.label = label
+        self.function = function
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1, label_value=None):
+        with self.lock:
+            self.values[label_value] = self.values.get(label_value, 0) + amount
+
+    def set_total(self, value, label_value=None):
+        # For totals the generator already keeps in local variables
+        self.values[label_value] = value
+
+    def value(self):
+        if self.function is not None:
+            return self.function()
+        if self.label is None:
+            return self.values.get(None, 0)
+        return dict(self.values)
+
+    def samples(self):
+        value = self.value()
+        if self.label is None:
+            return [(self.name, "", value)]
+        return [(self.name, f'{{{self.label}="{key}"}}', count) for key, count in sorted(value.items())]
+
+class Gauge(Counter):
+    """Value that goes up and down, e.g. a queue depth."""
+
+    kind = "gauge"
+
+    def set(self, value):
+        self.values[None] = value
+
+class Histogram:
+    """
+    Distribution of observed values in cumulative buckets.
+
+    Args:
+        name (str): Metric name.
+        help (str): One-line description.
+        buckets (tuple): Upper bounds of the buckets, ascending.
+    """
+
+    kind = "histogram"
+
+    def __init__(self, name, help, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.lock = threading.Lock()
+
+    def observe(self, value):
+        index = 0
+        while index < len(self.buckets) and value > self.buckets[index]:
+            index += 1
+
+        with self.lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.sum += value
+
+    def percentile(self, fraction):
+        # Upper bound of the bucket that holds the percentile
+        rank = fraction * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if count and seen >= rank:
+                return self.buckets[index] if index < len(self.buckets) else float("inf")
+        return 0.0
+
+    def value(self):
+        return {"count": self.count, "sum": self.sum,
+                "p50": self.percentile(0.5), "p99": self.percentile(0.99)}
+
+    def samples(self):
+        samples = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + ("+Inf",), self.counts):
+            cumulative += count
+            samples.append((f"{self.name}_bucket", f'{{le="{bound}"}}', cumulative))
+        samples.append((f"{self.name}_sum", "", self.sum))
+        samples.append((f"{self.name}_count", "", self.count))
+        return samples
+
+class Profiler:
+    """
+    Cumulative wall time per stage of the generator, and optionally the
+    code lines that allocate the most memory (through tracemalloc).
+
+    The generator thread times its stages with start() and lap(); other
+    threads report their own stages with add().
+
+    Args:
+        trace_allocations (bool): Track allocations with tracemalloc.
+    """
+
+    def __init__(self, trace_allocations=False):
+        self.stages = {}
+        self.mark = 0.0
+        self.lock = threading.Lock()
+        self.trace_allocations = trace_allocations
+
+        if trace_allocations:
+            tracemalloc.start()
+
+    def start(self):
+        self.mark = time.perf_counter()
+
+    def lap(self, stage):
+        # Charge the time since the last mark to `stage`
+        now = time.perf_counter()
+        totals = self.stages.setdefault(stage, [0.0, 0])
+        totals[0] += now - self.mark
+        totals[1] += 1
+        self.mark = now
+
+    def add(self, stage, seconds):
+        with self.lock:
+            totals = self.stages.setdefault(stage, [0.0, 0])
+            totals[0] += seconds
+            totals[1] += 1
+
+    def hot_spots(self, limit=10):
+        """
+        The code lines holding the most allocated memory.
+
+        Returns:
+            list: Dicts with the location, size in KB and block count.
+        """
+        if not self.trace_allocations:
+            return []
+
+        statistics = tracemalloc.take_snapshot().statistics("lineno")
+        return [{"location": str(stat.traceback), "size_kb": stat.size / 1024, "count": stat.count}
+                for stat in statistics[:limit]]
+
+    def report(self):
+        return {
+            "stages": {stage: {"seconds": seconds, "calls": calls}
+                       for stage, (seconds, calls) in self.stages.items()},
+            "allocations": self.hot_spots()
+        }
+
+    def close(self):
+        if self.trace_allocations:
+            tracemalloc.stop()
+
+class Metrics:
+    """
+    Counters, gauges and histograms of one generator run.
+
+    Snapshots of all metrics are appended to a JSON-lines file every
+    `interval` seconds, and can be scraped in the Prometheus text format
+    from a local HTTP endpoint.
+
+    Args:
+        path (str): JSON-lines file for snapshots, None to disable.
+        interval (float): Seconds between snapshots.
+        port (int): Port of the Prometheus text endpoint, None to disable.
+        host (str): Address the endpoint listens on.
+        profile (bool): Record cumulative time per generator stage.
+        trace_allocations (bool): Record allocation hot spots with tracemalloc.
+    """
+
+    def __init__(self, path=None, interval=10.0, port=None, host="127.0.0.1",
+                 profile=False, trace_allocations=False):
+        self.path = path
+        self.interval = interval
+        self.metrics = []
+
+        self.events = self.counter("eventgen_events_total", "Events generated.")
+        self.bytes = self.counter("eventgen_bytes_total", "Logical bytes generated.")
+        self.responses = self.counter("eventgen_responses_total", "HTTP responses by status code.",
+                                      label="status")
+        self.send_latency = self.histogram("eventgen_send_latency_seconds", "Duration of one HTTP request.")
+
+        self.profiler = Profiler(trace_allocations) if profile or trace_allocations else None
+
+        self.stopping = threading.Event()
+        self.reporter = None
+        if path:
+            self.reporter = threading.Thread(target=self._report, name="metrics", daemon=True)
+            self.reporter.start()
+
+        self.server = None
+        if port is not None:
+            self.server = http.server.ThreadingHTTPServer((host, port), self._handler())
+            self.server.daemon_threads = True
+            threading.Thread(target=self.server.serve_forever, name="metrics-http", daemon=True).start()
+
+    def counter(self, name, help, label=None, function=None):
+        metric = Counter(name, help, label, function)
+        self.metrics.append(metric)
+        return metric
+
+    def gauge(self, name, help, function=None):
+        metric = Gauge(name, help, function=function)
+        self.metrics.append(metric)
+        return metric
+
+    def histogram(self, name, help, buckets=LATENCY_BUCKETS):
+        metric = Histogram(name, help, buckets)
+        self.metrics.append(metric)
+        return metric
+
+    def snapshot(self):
+        snapshot = {"time": time.time()}
+        for metric in self.metrics:
+            snapshot[metric.name] = metric.value()
+        return snapshot
+
+    def prometheus(self):
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{labels} {value}")
+        return "\n".join(lines) + "\n"
+
+    def _handler(self):
+        metrics = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = metrics.prometheus().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def _write(self, snapshot):
+        with open(self.path, 'a') as f:
+            f.write(json.dumps(snapshot) + "\n")
+
+    def _report(self):
+        while not self.stopping.wait(self.interval):
+            self._write(self.snapshot())
+
+    def close(self):
+        """
+        Stop reporting and write a last snapshot, with the profile when
+        profiling is on.
+
+        Returns:
+            dict: The last snapshot.
+        """
+        self.stopping.set()
+        if self.reporter is not None:
+            self.reporter.join()
+
+        snapshot = self.snapshot()
+        if self.profiler is not None:
+            snapshot["profile"] = self.profiler.report()
+            self.profiler.close()
+
+        if self.path:
+            self._write(snapshot)
+
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+
+        return snapshot
@@ -0,0 +1,349 @@
+import argparse
+import asyncio
+import gzip
+import json
+import multiprocessing
+import queue
+import random
+import signal
+import socket
+import sys
+import threading
+import time
+import zlib
+
+try:
+    import uvloop
+except ImportError:
+    # Optional, the standard event loop works too, just slower
+    uvloop = None
+
+# Latency histogram buckets, upper bounds in microseconds: 1 us, 2 us, 4 us ... ~68 s
+LATENCY_BUCKETS = [2 ** exponent for exponent in range(27)]
+
+REASONS = {200: "OK", 400: "Bad Request", 401: "Unauthorized", 411: "Length Required",
+           415: "Unsupported Media Type", 429: "Too Many Requests", 503: "Service Unavailable"}
+
+def bucket_index(micros):
+    # Index of the first bucket whose upper bound holds the value
+    return min(len(LATENCY_BUCKETS) - 1, max(0, int(micros) - 1).bit_length())
+
+def percentile(buckets, fraction):
+    """
+    Estimate a latency percentile from histogram bucket counts.
+
+    Returns:
+        float: Upper bound of the bucket holding the percentile, in
+        milliseconds, or 0.0 for an empty histogram.
+    """
+    total = sum(buckets)
+    if not total:
+        return 0.0
+
+    rank = fraction * total
+    seen = 0
+    for index, count in enumerate(buckets):
+        seen += count
+        if seen >= rank:
+            return LATENCY_BUCKETS[index] / 1000
+    return LATENCY_BUCKETS[-1] / 1000
+
+def new_interval(second):
+    return {"second": second, "requests": 0, "events": 0, "bytes": 0, "wire_bytes": 0,
+            "statuses": {}, "latency": [0] * len(LATENCY_BUCKETS)}
+
+def merge_interval(total, interval):
+    for key in ("requests", "events", "bytes", "wire_bytes"):
+        total[key] += interval[key]
+    for status, count in interval["statuses"].items():
+        total["statuses"][status] = total["statuses"].get(status, 0) + count
+    total["latency"] = [a + b for a, b in zip(total["latency"], interval["latency"])]
+
+def count_events(body):
+    # Newline-delimited bodies hold one event per non-empty line
+    events = body.count(b"\n") + 1
+    if body.endswith(b"\n"):
+        events -= 1
+    return events if body.strip() else 0
+
+class MockCollector:
+    """
+    Local stand-in for the raw collector API.
+
+    Accepts POSTs with bearer auth and JSON, XML or newline-delimited
+    bodies, optionally gzip or deflate encoded. It counts events, bytes
+    and response latency per second, and can inject faults: fixed or
+    random latency, 429 and 503 responses, and connection resets.
+
+    Args:
+        token (str): Expected bearer token, None to accept any request.
+        latency (float): Fixed delay in seconds added to every response.
+        jitter (float): Extra random delay, up to this many seconds.
+        rate_429 (float): Fraction of requests answered with 429.
+        rate_503 (float): Fraction of requests answered with 503.
+        reset_rate (float): Fraction of requests whose connection is reset.
+        retry_after (int): Retry-After seconds sent with 429 and 503.
+    """
+
+    def __init__(self, token=None, latency=0.0, jitter=0.0, rate_429=0.0, rate_503=0.0,
+                 reset_rate=0.0, retry_after=1):
+        self.token = token.encode('utf-8') if token else None
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_429 = rate_429
+        self.rate_503 = rate_503
+        self.reset_rate = reset_rate
+        self.retry_after = retry_after
+
+        self.current = new_interval(int(time.time()))
+        self.intervals = []
+        self.lock = threading.Lock()
+        self.responses = {status: self._response(status) for status in REASONS}
+
+    def _response(self, status):
+        headers = f"HTTP/1.1 {status} {REASONS[status]}\r\nContent-Length: 0\r\n"
+        if status in (429, 503):
+            headers += f"Retry-After: {self.retry_after}\r\n"
+        return (headers + "\r\n").encode('ascii')
+
+    def _record(self, status, events, size, wire_size, started):
+        second = int(time.time())
+        with self.lock:
+            if second != self.current["second"]:
+                self.intervals.append(self.current)
+                self.current = new_interval(second)
+
+            interval = self.current
+            interval["requests"] += 1
+            interval["events"] += events
+            interval["bytes"] += size
+            interval["wire_bytes"] += wire_size
+            interval["statuses"][status] = interval["statuses"].get(status, 0) + 1
+            interval["latency"][bucket_index((time.perf_counter() - started) * 1e6)] += 1
+
+    def take_intervals(self):
+        """
+        Hand over the per-second intervals completed since the last call.
+
+        Returns:
+            list: Completed intervals, oldest first.
+        """
+        second = int(time.time())
+        with self.lock:
+            if second != self.current["second"]:
+                self.intervals.append(self.current)
+                self.current = new_interval(second)
+            intervals, self.intervals = self.intervals, []
+        return intervals
+
+    def _status(self, headers, method):
+        if method != b"POST":
+            return 400
+        if self.token is not None and headers.get(b"authorization") != b"Bearer " + self.token:
+            return 401
+
+        draw = random.random()
+        if draw < self.rate_429:
+            return 429
+        if draw < self.rate_429 + self.rate_503:
+            return 503
+        return 200
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b"\r\n\r\n")
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+                    break
+                started = time.perf_counter()
+
+                lines = head.split(b"\r\n")
+                method = lines[0].split(b" ", 1)[0]
+                headers = {}
+                for line in lines[1:]:
+                    name, _, value = line.partition(b":")
+                    if name:
+                        headers[name.strip().lower()] = value.strip()
+
+                if b"content-length" not in headers:
+                    writer.write(self.responses[411])
+                    break
+                body = await reader.readexactly(int(headers[b"content-length"]))
+
+                if self.reset_rate and random.random() < self.reset_rate:
+                    writer.transport.abort()
+                    return
+
+                status = self._status(headers, method)
+                events = size = 0
+
+                if status == 200:
+                    encoding = headers.get(b"content-encoding", b"identity")
+                    try:
+                        if encoding == b"gzip":
+                            data = gzip.decompress(body)
+                        elif encoding == b"deflate":
+                            data = zlib.decompress(body)
+                        elif encoding == b"identity":
+                            data = body
+                        else:
+                            data = None
+                            status = 415
+                    except (OSError, zlib.error, EOFError):
+                        data = None
+                        status = 400
+
+                    if data is not None:
+                        events = count_events(data)
+                        size = len(data)
+
+                delay = self.latency + (random.uniform(0, self.jitter) if self.jitter else 0.0)
+                if delay:
+                    await asyncio.sleep(delay)
+
+                writer.write(self.responses[status])
+                self._record(status, events, size, len(body), started)
+
+                if headers.get(b"connection", b"").lower() == b"close":
+                    break
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host, port, reuse_port=False, ready=None):
+        server = await asyncio.start_server(self.handle, host, port, reuse_port=reuse_port or None,
+                                            backlog=4096)
+        if ready is not None:
+            ready(server.sockets[0].getsockname()[1])
+        async with server:
+            await server.serve_forever()
+
+    def start_in_thread(self, host="127.0.0.1", port=0):
+        """
+        Serve from a background thread, e.g. inside a benchmark.
+
+        Returns:
+            int: The port the server listens on.
+        """
+        ports = queue.Queue()
+        thread = threading.Thread(target=lambda: asyncio.run(self.serve(host, port, ready=ports.put)),
+                                  name="mock-collector", daemon=True)
+        thread.start()
+        return ports.get()
+
+def _serve_process(options, results):
+    collector = MockCollector(**options["collector"])
+
+    def report():
+        while True:
+            time.sleep(1)
+            results.put(collector.take_intervals())
+
+    threading.Thread(target=report, daemon=True).start()
+
+    if uvloop is not None:
+        uvloop.install()
+    asyncio.run(collector.serve(options["host"], options["port"], reuse_port=options["processes"] > 1))
+
+def format_interval(interval):
+    latency = interval["latency"]
+    statuses = ", ".join(f"{status}: {count}" for status, count in sorted(interval["statuses"].items()))
+    return (f"{interval['requests']} req/s, {interval['events']} events/s, "
+            f"{interval['bytes'] / 1024**2:.2f} MB/s ({interval['wire_bytes'] / 1024**2:.2f} MB/s on the wire), "
+            f"p50 {percentile(latency, 0.5):.3f} ms, p99 {percentile(latency, 0.99):.3f} ms"
+            + (f", statuses {statuses}" if statuses else ""))
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Local mock of the raw collector API for load testing.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8088)
+    parser.add_argument("--processes", type=int, default=1,
+                        help="Server processes sharing the port (needs SO_REUSEPORT).")
+    parser.add_argument("--token", help="Expected bearer token, any request is accepted without one.")
+    parser.add_argument("--latency", type=float, default=0.0, help="Fixed response delay in seconds.")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Extra random delay, up to this many seconds.")
+    parser.add_argument("--rate-429", type=float, default=0.0, help="Fraction of requests answered with 429.")
+    parser.add_argument("--rate-503", type=float, default=0.0, help="Fraction of requests answered with 503.")
+    parser.add_argument("--reset-rate", type=float, default=0.0, help="Fraction of connections reset.")
+    parser.add_argument("--retry-after", type=int, default=1, help="Retry-After seconds for 429 and 503.")
+    parser.add_argument("--stats-file", help="Append one JSON line per second to this file.")
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+
+    if args.processes > 1 and not hasattr(socket, "SO_REUSEPORT"):
+        sys.exit("--processes needs SO_REUSEPORT, which this platform does not have.")
+
+    options = {
+        "host": args.host,
+        "port": args.port,
+        "processes": args.processes,
+        "collector": {
+            "token": args.token or None,
+            "latency": args.latency,
+            "jitter": args.jitter,
+            "rate_429": args.rate_429,
+            "rate_503": args.rate_503,
+            "reset_rate": args.reset_rate,
+            "retry_after": args.retry_after
+        }
+    }
+
+    results = multiprocessing.Queue()
+    processes = []
+    for index in range(args.processes):
+        process = multiprocessing.Process(target=_serve_process, args=(options, results),
+                                          name=f"mock-collector-{index}", daemon=True)
+        process.start()
+        processes.append(process)
+
+    print(f"Mock collector listening on http://{args.host}:{args.port}/ with {args.processes} process(es).")
+
+    # Print the totals on SIGTERM too, not only on Ctrl+C
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
+    stats_file = open(args.stats_file, 'a') if args.stats_file else None
+    pending = {}
+    totals = new_interval(0)
+
+    try:
+        while any(process.is_alive() for process in processes):
+            try:
+                intervals = results.get(timeout=1)
+            except queue.Empty:
+                continue
+
+            for interval in intervals:
+                second = interval["second"]
+                if second not in pending:
+                    pending[second] = new_interval(second)
+                merge_interval(pending[second], interval)
+
+            # Every process reports once a second, so older seconds are complete
+            for second in sorted(pending):
+                if second >= int(time.time()) - 1:
+                    break
+                interval = pending.pop(second)
+                merge_interval(totals, interval)
+                if interval["requests"]:
+                    print(f"{time.strftime('%H:%M:%S', time.localtime(second))} {format_interval(interval)}")
+                if stats_file is not None:
+                    stats_file.write(json.dumps(interval) + "\n")
+                    stats_file.flush()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for process in processes:
+            process.terminate()
+        if stats_file is not None:
+            stats_file.close()
+
+        print(f"Total: {totals['requests']} requests, {totals['events']} events, "
+              f"{totals['bytes']} bytes, {totals['wire_bytes']} bytes on the wire.")
+
+if __name__ == "__main__":
+    main()
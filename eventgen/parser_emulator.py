@@ -0,0 +1,499 @@
+import argparse
+import gzip
+import json
+import os
+import re
+import sys
+import time
+
+DEFAULT_PARSER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "parser",
+                              "oracle_audit_parser.json")
+
+# Events checked per round, each format is timed once per round
+CHUNK = 4096
+
+# Patterns the parser language provides without declaring them
+BUILTIN_PATTERNS = {
+    "number": r"-?\d+(?:\.\d+)?",
+    "identifier": r"[A-Za-z_][A-Za-z0-9_.\-]*",
+    "quoteOrSpace": r'"(?:[^"\\]|\\.)*"|\S+',
+    "quotable": r'"(?:[^"\\]|\\.)*"|[^\s,;]+'
+}
+
+# A placeholder without a pattern matches up to the next literal
+DEFAULT_PATTERN = r"\S+?"
+
+# e.g. $timestamp=timestamp$ or $_=key$
+PLACEHOLDER = re.compile(r"\$([A-Za-z0-9_.]+)(?:=([A-Za-z0-9_]+))?\$")
+
+# Simple elements of an XML event, e.g. <Userid>SALLY</Userid>
+XML_ELEMENT = re.compile(r"<([A-Za-z_][\w.\-]*)>([^<]*)</\1>")
+
+# An entity escaped a second time, shown as e.g. &apos; after parsing
+DOUBLE_ESCAPED = re.compile(r"&amp;(?:apos|quot|lt|gt|amp|#\d+);")
+
+# Mismatch examples kept per kind and field
+EXAMPLES = 3
+
+class LenientReader:
+    """
+    Reads the relaxed JSON of parser definitions: // and /* */ comments,
+    unquoted keys, single-quoted strings, and missing or trailing commas.
+    Double-quoted strings are decoded like JSON strings.
+
+    Args:
+        text (str): The parser definition.
+    """
+
+    TOKEN = re.compile(r"""
+        (?P<space>(?:\s|//[^\n]*|/\*.*?\*/)+)
+        | (?P<string>"(?:[^"\\]|\\.)*")
+        | (?P<single>'(?:[^'\\]|\\.)*')
+        | (?P<punct>[{}\[\]:,])
+        | (?P<bare>[^\s{}\[\]:,"'/]+)
+    """, re.VERBOSE | re.DOTALL)
+
+    def __init__(self, text):
+        self.tokens = []
+        position = 0
+        while position < len(text):
+            match = self.TOKEN.match(text, position)
+            if match is None:
+                raise ValueError(f"Invalid parser definition at offset {position}: {text[position:position + 20]!r}")
+            if match.lastgroup != "space":
+                self.tokens.append((match.lastgroup, match.group()))
+            position = match.end()
+        self.index = 0
+
+    def _next(self):
+        if self.index >= len(self.tokens):
+            raise ValueError("Invalid parser definition: unexpected end.")
+        token = self.tokens[self.index]
+        self.index += 1
+        return token
+
+    def _peek(self):
+        return self.tokens[self.index] if self.index < len(self.tokens) else (None, None)
+
+    def _skip_commas(self):
+        while self._peek() == ("punct", ","):
+            self.index += 1
+
+    def value(self):
+        kind, text = self._next()
+
+        if kind == "string":
+            return json.loads(text)
+        if kind == "single":
+            return json.loads('"' + text[1:-1].replace("\\'", "'").replace('"', '\\"') + '"')
+        if kind == "bare":
+            if text in ("true", "false", "null"):
+                return {"true": True, "false": False, "null": None}[text]
+            try:
+                return json.loads(text)
+            except ValueError:
+                return text
+        if text == "{":
+            return self._object()
+        if text == "[":
+            return self._array()
+        raise ValueError(f"Invalid parser definition: unexpected {text!r}.")
+
+    def _key(self):
+        kind, text = self._next()
+        if kind == "string":
+            return json.loads(text)
+        if kind == "single":
+            return text[1:-1]
+        if kind == "bare":
+            return text
+        raise ValueError(f"Invalid parser definition: unexpected {text!r} in place of a key.")
+
+    def _object(self):
+        result = {}
+        self._skip_commas()
+        while self._peek() != ("punct", "}"):
+            key = self._key()
+            if self._next() != ("punct", ":"):
+                raise ValueError(f"Invalid parser definition: missing ':' after {key!r}.")
+            result[key] = self.value()
+            self._skip_commas()
+        self.index += 1
+        return result
+
+    def _array(self):
+        result = []
+        self._skip_commas()
+        while self._peek() != ("punct", "]"):
+            result.append(self.value())
+            self._skip_commas()
+        self.index += 1
+        return result
+
+def load_definition(path=DEFAULT_PARSER):
+    """
+    Read a parser definition file.
+
+    Returns:
+        dict: The definition, with "attributes", "patterns" and "formats".
+    """
+    with open(path, encoding='utf-8') as f:
+        return LenientReader(f.read()).value()
+
+class CompiledFormat:
+    """
+    One entry of the "formats" list, compiled into a single regex.
+
+    Text around the placeholders is taken as a regex; `.*` matches as
+    little as it can, so a repeated format picks up every match in
+    order. A placeholder captures a field, `$name=pattern$` with a named
+    pattern. Placeholders named `_` come in pairs, the first captures
+    the field name and the second its value.
+
+    Args:
+        source (str | dict): The format, or an object with "format",
+            "repeat" and "halt".
+        patterns (dict): Named patterns of the definition.
+    """
+
+    def __init__(self, source, patterns):
+        if isinstance(source, str):
+            source = {"format": source}
+        self.source = source["format"]
+        self.repeat = bool(source.get("repeat", False))
+        self.halt = bool(source.get("halt", False))
+
+        parts = []
+        self.fields = []
+        position = 0
+        for match in PLACEHOLDER.finditer(self.source):
+            parts.append(self._literal(self.source[position:match.start()]))
+            name, pattern = match.groups()
+            if pattern is None:
+                regex = DEFAULT_PATTERN
+            elif pattern in patterns:
+                regex = patterns[pattern]
+            elif pattern in BUILTIN_PATTERNS:
+                regex = BUILTIN_PATTERNS[pattern]
+            else:
+                raise ValueError(f"Unknown pattern '{pattern}' in format {self.source!r}.")
+            parts.append(f"({regex})")
+            self.fields.append(name)
+            position = match.end()
+        parts.append(self._literal(self.source[position:]))
+
+        if self.fields.count("_") % 2:
+            raise ValueError(f"Invalid format {self.source!r}. '$_$' placeholders come in name/value pairs.")
+        self.pairs = "_" in self.fields
+
+        # A leading wildcard only means the rest may start anywhere, which search() does without backtracking
+        regex = "".join(parts)
+        self.anywhere = regex.startswith(".*?")
+        if self.anywhere:
+            regex = regex[3:]
+        self.regex = re.compile(regex)
+
+        # Cost of this format over all events it was applied to
+        self.seconds = 0.0
+        self.events = 0
+        self.matches = 0
+
+    @staticmethod
+    def _literal(text):
+        return re.sub(r"\.\*(?!\?)", ".*?", text)
+
+    def _fields(self, groups, fields):
+        if not self.pairs:
+            fields.update(zip(self.fields, groups))
+            return
+
+        pending = None
+        for name, value in zip(self.fields, groups):
+            if name != "_":
+                fields[name] = value
+            elif pending is None:
+                pending = value.strip()
+            else:
+                fields[pending] = value
+                pending = None
+
+    def apply(self, event, fields):
+        """
+        Add the fields this format extracts from `event` to `fields`.
+
+        Returns:
+            bool: Whether the format matched at all.
+        """
+        if not self.repeat:
+            match = self.regex.search(event) if self.anywhere else self.regex.match(event)
+            if match is None:
+                return False
+            self._fields(match.groups(), fields)
+            return True
+
+        if not self.anywhere:
+            # Every match has to start where the previous one ended
+            position = 0
+            match = self.regex.match(event)
+            while match is not None and match.end() > position:
+                self._fields(match.groups(), fields)
+                position = match.end()
+                match = self.regex.match(event, position)
+            return position > 0
+
+        found = self.regex.findall(event)
+        if not found:
+            return False
+        if self.fields == ["_", "_"]:
+            # The common case of name/value pairs only
+            for name, value in found:
+                fields[name.strip()] = value
+        else:
+            for groups in found:
+                self._fields(groups if isinstance(groups, tuple) else (groups,), fields)
+        return True
+
+class ParserEmulator:
+    """
+    Applies a parser definition to events the way the SIEM would: every
+    format is tried in order, and all that match add their fields, until
+    one marked "halt" matches. The "attributes" are added to every event.
+
+    Args:
+        definition (dict): A definition read by load_definition.
+    """
+
+    def __init__(self, definition):
+        self.attributes = definition.get("attributes", {})
+        patterns = definition.get("patterns", {})
+        self.formats = [CompiledFormat(source, patterns) for source in definition.get("formats", [])]
+        if not self.formats:
+            raise ValueError("The parser definition has no formats.")
+
+    def parse(self, event):
+        fields = dict(self.attributes)
+        for compiled in self.formats:
+            if compiled.apply(event, fields) and compiled.halt:
+                break
+        return fields
+
+    def parse_many(self, events):
+        """
+        Parse a chunk of events, one format at a time so that each format
+        is timed once per chunk rather than once per event.
+
+        Returns:
+            list: The fields of every event.
+        """
+        results = [dict(self.attributes) for _ in events]
+        halted = [False] * len(events)
+
+        for compiled in self.formats:
+            apply = compiled.apply
+            matches = 0
+            start = time.perf_counter()
+            for index, event in enumerate(events):
+                if not halted[index] and apply(event, results[index]):
+                    matches += 1
+                    if compiled.halt:
+                        halted[index] = True
+            compiled.seconds += time.perf_counter() - start
+            compiled.events += len(events)
+            compiled.matches += matches
+
+        return results
+
+def expected_fields(event):
+    # Fields of the event itself, to compare with what the parser extracts
+    if event.startswith("{"):
+        try:
+            return {key: str(value) for key, value in json.loads(event).items()}
+        except ValueError:
+            return {}
+    return dict(XML_ELEMENT.findall(event))
+
+class Validator:
+    """
+    Checks that a parser definition extracts every field of the events,
+    with its exact value.
+
+    For every field of an event, the report counts whether the parser
+    extracted it, whether the value came out whole ("truncated" when the
+    patterns stop early) and whether the value was escaped twice, e.g.
+    &amp;apos; in place of &apos;, which shows up as a literal entity
+    once parsed.
+
+    Args:
+        definition (dict): A definition read by load_definition.
+        timestamp_field (str): Field every event must get from the parser.
+    """
+
+    def __init__(self, definition, timestamp_field="timestamp"):
+        self.emulator = ParserEmulator(definition)
+        self.timestamp_field = timestamp_field
+        self.events = 0
+        self.bytes = 0
+        self.seconds = 0.0
+        self.without_timestamp = 0
+        self.present = {}
+        self.extracted = {}
+        # Events whose fields all came out whole, by their field names
+        self.clean = {}
+        self.mismatches = {"missing": {}, "truncated": {}, "double_escaped": {}}
+        self.examples = []
+        self.example_keys = {}
+
+    def _mismatch(self, kind, field, expected, parsed):
+        counts = self.mismatches[kind]
+        counts[field] = counts.get(field, 0) + 1
+
+        key = (kind, field)
+        if self.example_keys.get(key, 0) < EXAMPLES:
+            self.example_keys[key] = self.example_keys.get(key, 0) + 1
+            self.examples.append({"kind": kind, "field": field, "expected": expected, "parsed": parsed})
+
+    def check(self, events):
+        """Parse and check a list of events."""
+        start = time.perf_counter()
+        results = self.emulator.parse_many(events)
+
+        present, extracted, clean = self.present, self.extracted, self.clean
+        timestamp_field = self.timestamp_field
+        for event, fields in zip(events, results):
+            if timestamp_field not in fields:
+                self.without_timestamp += 1
+
+            expected = expected_fields(event)
+            # Most events parse cleanly, which takes a single comparison
+            if expected.items() <= fields.items() and "&amp;" not in event:
+                names = tuple(expected)
+                clean[names] = clean.get(names, 0) + 1
+                continue
+
+            for name, value in expected.items():
+                present[name] = present.get(name, 0) + 1
+                parsed = fields.get(name)
+                if parsed == value:
+                    extracted[name] = extracted.get(name, 0) + 1
+                elif parsed is None:
+                    self._mismatch("missing", name, value, None)
+                else:
+                    self._mismatch("truncated", name, value, parsed)
+                if "&amp;" in value and DOUBLE_ESCAPED.search(value):
+                    self._mismatch("double_escaped", name, value, parsed)
+
+        self.events += len(events)
+        self.bytes += sum(map(len, events))
+        self.seconds += time.perf_counter() - start
+
+    def check_stream(self, lines):
+        # Check an iterable of events in chunks
+        chunk = []
+        for line in lines:
+            line = line.rstrip("\r\n")
+            if line:
+                chunk.append(line)
+            if len(chunk) >= CHUNK:
+                self.check(chunk)
+                chunk = []
+        if chunk:
+            self.check(chunk)
+
+    def report(self):
+        """
+        Summary of all events checked so far.
+
+        Returns:
+            dict: Throughput, coverage per field and overall, mismatch
+            counts per kind and field, examples, and the cost of every
+            format.
+        """
+        present, extracted = dict(self.present), dict(self.extracted)
+        for names, count in self.clean.items():
+            for name in names:
+                present[name] = present.get(name, 0) + count
+                extracted[name] = extracted.get(name, 0) + count
+
+        total = sum(present.values())
+        return {
+            "events": self.events,
+            "bytes": self.bytes,
+            "seconds": self.seconds,
+            "events_per_sec": self.events / self.seconds if self.seconds > 0 else 0.0,
+            "coverage": sum(extracted.values()) / total if total else 1.0,
+            "fields": {name: extracted.get(name, 0) / count for name, count in sorted(present.items())},
+            "without_timestamp": self.without_timestamp,
+            "mismatches": self.mismatches,
+            "examples": self.examples,
+            "formats": [{
+                "format": compiled.source,
+                "repeat": compiled.repeat,
+                "matched": compiled.matches / compiled.events if compiled.events else 0.0,
+                "seconds": compiled.seconds,
+                "us_per_event": compiled.seconds / compiled.events * 1e6 if compiled.events else 0.0
+            } for compiled in self.emulator.formats]
+        }
+
+def open_events(path):
+    # File sink output, gzip compressed or not
+    if path == "-":
+        return sys.stdin
+    if path.endswith(".gz"):
+        return gzip.open(path, 'rt', encoding='utf-8')
+    return open(path, encoding='utf-8')
+
+def validate_file(path, parser_path=DEFAULT_PARSER):
+    """
+    Check every event of a file written by the file sink.
+
+    Returns:
+        dict: The report of Validator.report().
+    """
+    validator = Validator(load_definition(parser_path))
+    with open_events(path) as f:
+        validator.check_stream(f)
+    return validator.report()
+
+def print_report(report, file=None):
+    print(f"Checked {report['events']} events, {report['bytes']} bytes in {report['seconds']:.2f}s "
+          f"({report['events_per_sec']:.0f} events/s).", file=file)
+    print(f"Field coverage: {report['coverage'] * 100:.2f}%", file=file)
+    for name, share in report["fields"].items():
+        print(f"  {name}: {share * 100:.2f}%", file=file)
+    if report["without_timestamp"]:
+        print(f"Events without a timestamp: {report['without_timestamp']}", file=file)
+
+    for kind, counts in report["mismatches"].items():
+        for name, count in sorted(counts.items()):
+            print(f"Mismatch {kind} {name}: {count}", file=file)
+    for example in report["examples"]:
+        print(f"  e.g. {example['kind']} {example['field']}: expected {example['expected']!r}, "
+              f"parsed {example['parsed']!r}", file=file)
+
+    for compiled in report["formats"]:
+        print(f"Format {compiled['format']!r}: matched {compiled['matched'] * 100:.1f}%, "
+              f"{compiled['us_per_event']:.2f} us/event", file=file)
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Check generated events against the SIEM parser definition.")
+    parser.add_argument("events", help="File of events, one per line, as written by the file sink ('-' for stdin).")
+    parser.add_argument("--parser", default=DEFAULT_PARSER, help="Path to the parser definition.")
+    parser.add_argument("--output", help="Write the report as JSON to this file.")
+    parser.add_argument("--min-coverage", type=float, default=None,
+                        help="Exit with an error below this share of correctly extracted fields, e.g. 1.0.")
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    report = validate_file(args.events, args.parser)
+    print_report(report)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if args.min_coverage is not None and report["coverage"] < args.min_coverage:
+        sys.exit(f"Field coverage {report['coverage'] * 100:.2f}% is below {args.min_coverage * 100:.2f}%.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,322 @@
+import mmap
+import os
+import random
+import re
+from concurrent.futures import ProcessPoolExecutor
+import xml_handler
+
+# Bytes read from the start of a file to detect its format
+DETECT_SIZE = 4096
+
+# Extension of the Oracle OS audit files in a directory
+AUD_EXTENSION = ".aud"
+
+# Parsers by format name, tried in this order by detect_format
+PARSERS = {}
+
+def register(parser):
+    """
+    Add a parser to the registry. A parser has a `name`, and methods
+    that work on a memory-mapped file:
+
+    - detect(head): whether the first bytes of a file are in its format.
+    - spans(mapped): the (start, end) byte offsets of every record.
+    - records(mapped): every parsed record, in one pass.
+    - parse(mapped, start, end): the record of one span.
+
+    Returns:
+        The parser.
+    """
+    PARSERS[parser.name] = parser
+    return parser
+
+class OsAuditParser:
+    """
+    Oracle OS audit files (.aud), as written to the audit_file_dest
+    directory. A file opens with a header about the instance, then each
+    record starts with a timestamp line followed by fields such as:
+
+        ACTION :[102] 'INSERT INTO users ...'
+        DATABASE USER:[4] 'jdoe'
+
+    The number in brackets is the length of the value in bytes, so
+    values are sliced out directly, including values that span lines
+    or hold quotes. Values whose length does not end on a closing quote
+    run up to the first quote that ends a line before the next field.
+    Field names become lowercase with underscores, e.g. "database_user",
+    and the header line is kept as "timestamp".
+    """
+
+    name = "aud"
+
+    # e.g. Wed Feb 10 14:23:19 2021 +01:00, days may be padded
+    HEADER = re.compile(rb"^(?:Mon|Tue|Wed|Thu|Fri|Sat|Sun) +[A-Z][a-z]{2} +\d+ +\d\d:\d\d:\d\d +\d{4}[^\n]*",
+                        re.MULTILINE)
+    # e.g. DATABASE USER:[4] ' or LENGTH : ', up to the opening quote
+    FIELD = re.compile(rb"([A-Z][A-Z0-9_$# ]*?) *:(?:\[(\d+)\])? *(['\"])")
+
+    def detect(self, head):
+        return self.HEADER.search(head) is not None and re.search(rb"^[A-Z][A-Z ]*:\[\d+\] '", head,
+                                                                  re.MULTILINE) is not None
+
+    def _closing_quote(self, mapped, value_start, quote):
+        # Without a usable length, the value ends at a quote that closes a line followed by the next field
+        position = mapped.find(quote, value_start)
+        while position >= 0:
+            following = mapped[position + 1:position + 2]
+            if following == b"":
+                return position
+            if following == b"\n":
+                line = position + 2
+                if (mapped[line:line + 1] in (b"", b"\n") or self.FIELD.match(mapped, line)
+                        or self.HEADER.match(mapped, line)):
+                    return position
+            position = mapped.find(quote, position + 1)
+
+        end = mapped.find(b"\n", value_start)
+        return len(mapped) if end < 0 else end
+
+    def _walk(self, mapped, build):
+        # Yield (start, end, record) per record, the record only when `build` is set
+        size = len(mapped)
+        keys = {}
+        match_field = self.FIELD.match
+        header = self.HEADER.search(mapped)
+        while header is not None:
+            start = header.start()
+            record = {"timestamp": header.group(0).strip().decode('utf-8', 'replace')} if build else None
+
+            position = header.end() + 1
+            match = match_field(mapped, position)
+            while match is not None:
+                name, length, quote = match.groups()
+                value_start = match.end()
+
+                # Slice by the length prefix when it ends on the closing quote
+                if length is not None and mapped[value_start + int(length):value_start + int(length) + 1] == quote:
+                    value_end = value_start + int(length)
+                else:
+                    value_end = self._closing_quote(mapped, value_start, quote)
+
+                if build:
+                    key = keys.get(name)
+                    if key is None:
+                        key = keys[name] = name.decode('ascii').strip().replace(' ', '_').lower()
+                    record[key] = mapped[value_start:value_end].decode('utf-8', 'replace')
+
+                # The next field starts on the line after the closing quote
+                if mapped[value_end + 1:value_end + 2] == b"\n":
+                    position = value_end + 2
+                else:
+                    position = mapped.find(b"\n", value_end)
+                    position = size if position < 0 else position + 1
+                match = match_field(mapped, position)
+
+            yield start, position, record
+            header = self.HEADER.search(mapped, position)
+
+    def spans(self, mapped):
+        for start, end, _ in self._walk(mapped, False):
+            yield start, end
+
+    def records(self, mapped):
+        for _, _, record in self._walk(mapped, True):
+            yield record
+
+    def parse(self, mapped, start, end):
+        for _, _, record in self._walk(mapped[start:end], True):
+            return record
+        return {}
+
+class KeyValueParser:
+    """
+    The KEY: "value" layout of samples/audit_log.txt, one field per line
+    and a TIMESTAMP line at the start of every record.
+    """
+
+    name = "keyvalue"
+
+    FIELD = re.compile(rb'^[A-Z][A-Z0-9_$#]*: "', re.MULTILINE)
+
+    def detect(self, head):
+        return self.FIELD.search(head) is not None
+
+    def spans(self, mapped):
+        return xml_handler._record_spans(mapped)
+
+    def records(self, mapped):
+        for start, end in xml_handler._record_spans(mapped):
+            record = xml_handler._parse_span(mapped, start, end)
+            if record:
+                yield record
+
+    def parse(self, mapped, start, end):
+        return xml_handler._parse_span(mapped, start, end)
+
+# The more specific layout first
+register(OsAuditParser())
+register(KeyValueParser())
+
+def detect_format(file_path):
+    """
+    Name of the registered format a file is in, from its first bytes.
+
+    Raises:
+        ValueError: When no parser recognizes the file.
+    """
+    with open(file_path, 'rb') as f:
+        head = f.read(DETECT_SIZE)
+
+    for name, parser in PARSERS.items():
+        if parser.detect(head):
+            return name
+
+    raise ValueError(f"Unknown audit log format: {file_path}. Use one of {', '.join(PARSERS)}.")
+
+def get_parser(file_path, sample_format="auto"):
+    if sample_format == "auto":
+        sample_format = detect_format(file_path)
+    if sample_format not in PARSERS:
+        raise ValueError(f"Invalid sample format. Use 'auto' or one of {', '.join(PARSERS)}.")
+    return PARSERS[sample_format]
+
+def source_files(path):
+    """
+    The audit files to read for a samples path: the file itself, or the
+    .aud files of a directory in name order.
+
+    Returns:
+        list: File paths.
+    """
+    if not os.path.isdir(path):
+        return [path]
+
+    files = sorted(entry.path for entry in os.scandir(path)
+                   if entry.is_file() and entry.name.endswith(AUD_EXTENSION))
+    if not files:
+        raise ValueError(f"No {AUD_EXTENSION} files in {path}.")
+    return files
+
+def _open_mapped(file_path):
+    # Empty files cannot be mapped
+    f = open(file_path, 'rb')
+    if os.fstat(f.fileno()).st_size == 0:
+        f.close()
+        return None, None
+    return f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+def parse_file(file_path, sample_format="auto"):
+    """
+    Parse all records of one audit file.
+
+    Returns:
+        list: The parsed records.
+    """
+    f, mapped = _open_mapped(file_path)
+    if f is None:
+        return []
+    parser = get_parser(file_path, sample_format)
+
+    with f, mapped:
+        return list(parser.records(mapped))
+
+def sample_file(file_path, count, sample_format="auto", seed=None):
+    """
+    Reservoir-sample `count` records from one audit file.
+
+    Only the byte offsets of the candidate records are kept while the
+    file is scanned, and just the chosen records are parsed at the end.
+
+    Returns:
+        tuple: The number of records in the file, and the sampled
+        records in file order.
+    """
+    f, mapped = _open_mapped(file_path)
+    if f is None:
+        return 0, []
+    parser = get_parser(file_path, sample_format)
+    rng = random.Random(seed)
+
+    with f, mapped:
+        reservoir = []
+        seen = 0
+        for seen, span in enumerate(parser.spans(mapped), 1):
+            if seen <= count:
+                reservoir.append(span)
+            else:
+                slot = rng.randrange(seen)
+                if slot < count:
+                    reservoir[slot] = span
+
+        records = (parser.parse(mapped, start, end) for start, end in sorted(reservoir))
+        return seen, [record for record in records if record]
+
+def _map_files(function, files, arguments, workers):
+    # One task per file, in a process pool when there are several files and CPUs
+    workers = workers or os.cpu_count() or 1
+    if len(files) == 1 or workers == 1:
+        for file_path, each in zip(files, arguments):
+            yield function(file_path, *each)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        yield from executor.map(function, files, *zip(*arguments))
+
+def iter_path(path, sample_format="auto", workers=None):
+    """
+    Parse an audit file, or every .aud file of a directory in parallel
+    across a process pool.
+
+    Args:
+        path (str): Path to an audit file or a directory.
+        sample_format (str): Registered format name, or "auto" to detect
+            the format of every file.
+        workers (int): Number of parser processes, all CPUs by default.
+
+    Yields:
+        dict: One parsed record, in file order.
+    """
+    files = source_files(path)
+    for records in _map_files(parse_file, files, [(sample_format,)] * len(files), workers):
+        yield from records
+
+def parse_path(path, sample_format="auto", workers=None):
+    return list(iter_path(path, sample_format, workers))
+
+def sample_path(path, count, sample_format="auto", workers=None, rng=random):
+    """
+    Randomly pick `count` records from an audit file, or from all .aud
+    files of a directory.
+
+    Every file is reservoir-sampled in parallel, then the reservoirs are
+    merged by drawing each pick from a file in proportion to the records
+    it has left, so every record of the directory is equally likely to
+    be picked.
+
+    Returns:
+        list: The sampled records.
+    """
+    files = source_files(path)
+    arguments = [(count, sample_format, rng.getrandbits(64)) for _ in files]
+    results = list(_map_files(sample_file, files, arguments, workers))
+    if len(results) == 1:
+        return results[0][1]
+
+    remaining = [seen for seen, _ in results]
+    reservoirs = [list(records) for _, records in results]
+    picked = []
+    total = sum(remaining)
+    while len(picked) < count and total > 0:
+        target = rng.randrange(total)
+        index = 0
+        while target >= remaining[index]:
+            target -= remaining[index]
+            index += 1
+
+        reservoir = reservoirs[index]
+        if reservoir:
+            picked.append(reservoir.pop(rng.randrange(len(reservoir))))
+        remaining[index] -= 1
+        total -= 1
+
+    return picked
@@ -0,0 +1,199 @@
+import bisect
+from array import array
+import math
+import random
+import time
+from datetime import datetime
+import pytz
+import xml_handler
+
+# Points in the cumulative rate table, steps and burst edges are off by at most one
+RESOLUTION = 100000
+
+DURATION_UNITS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+def parse_duration(value):
+    # Seconds as a number, or a string such as "90s", "5m", "2h" or "1d"
+    if isinstance(value, (int, float)):
+        return float(value)
+
+    number, unit = value[:-1], value[-1]
+    if unit not in DURATION_UNITS:
+        raise ValueError("Invalid duration unit. Use 's', 'm', 'h' or 'd'.")
+    return float(number) * DURATION_UNITS[unit]
+
+def seconds_into_day(timestamp, timezone_name):
+    moment = datetime.fromtimestamp(timestamp, pytz.timezone(timezone_name))
+    return moment.hour * 3600 + moment.minute * 60 + moment.second + moment.microsecond / 1e6
+
+class LoadProfile:
+    """
+    Relative rate curve over the time range of a run.
+
+    The curve is the product of up to three shapes:
+
+    - points: piecewise-linear levels, e.g. [["0m", 1], ["1h", 4]] ramps
+      from 1 to 4 over the first hour. Two points at the same time make
+      a step. The last level holds until the end of the run.
+    - diurnal: a sinusoidal day cycle, 1 + amplitude * cos(...), that
+      peaks at `peak` o'clock in the run's timezone.
+    - bursts: incidents arriving as a Poisson process, `per_hour` on
+      average, that multiply the rate by `multiplier` for `duration`.
+
+    Only the shape matters, the scheduler scales it so that the whole
+    budget is spent over the time range. Cumulative() and inverse()
+    look the curve up in a precomputed table of its running integral.
+
+    Args:
+        duration (float): Length of the run in seconds.
+        start (float): Start of the run in seconds since the epoch.
+        timezone (str): Timezone the diurnal peak is given in.
+        points (list): [time, level] pairs of the piecewise-linear shape.
+        diurnal (dict): "amplitude" (0 to 1), "peak" and "period" times.
+        bursts (dict): "per_hour", "duration" and "multiplier".
+        rng (random.Random): Source of randomness for the burst times.
+        seed (int): Seed for the burst times instead of `rng`, so that
+            several workers see the same bursts.
+        resolution (int): Intervals in the cumulative rate table.
+    """
+
+    def __init__(self, duration, start=None, timezone=xml_handler.DEFAULT_TIMEZONE,
+                 points=None, diurnal=None, bursts=None, rng=random, seed=None, resolution=RESOLUTION):
+        if duration <= 0:
+            raise ValueError("A load profile needs a positive duration.")
+
+        self.duration = float(duration)
+        self.start = time.time() if start is None else start
+
+        self.times = []
+        self.levels = []
+        for point_time, level in points or [[0, 1]]:
+            if level < 0:
+                raise ValueError("Load profile levels cannot be negative.")
+            self.times.append(parse_duration(point_time))
+            self.levels.append(float(level))
+        if self.times != sorted(self.times):
+            raise ValueError("Load profile points must be in time order.")
+
+        self.diurnal = None
+        if diurnal:
+            amplitude = diurnal.get("amplitude", 0.5)
+            if not 0 <= amplitude <= 1:
+                raise ValueError("The diurnal amplitude must be between 0 and 1.")
+            period = parse_duration(diurnal.get("period", "1d"))
+            # Phase so the cosine tops out at the peak time of day
+            phase = seconds_into_day(self.start, timezone) - parse_duration(diurnal.get("peak", "14h"))
+            self.diurnal = (amplitude, period, phase)
+
+        self.bursts = []
+        self.burst_length = 0.0
+        if bursts:
+            if seed is not None:
+                rng = random.Random(seed)
+            per_second = bursts.get("per_hour", 1.0) / 3600
+            length = self.burst_length = parse_duration(bursts.get("duration", "5m"))
+            multiplier = bursts.get("multiplier", 5.0)
+            moment = rng.expovariate(per_second) if per_second > 0 else self.duration
+            while moment < self.duration:
+                self.bursts.append((moment, multiplier))
+                moment += rng.expovariate(per_second)
+        self.burst_starts = [begin for begin, _ in self.bursts]
+
+        self._build_table(resolution)
+
+    def level(self, offset):
+        # Piecewise-linear interpolation, the later point wins at a step
+        index = bisect.bisect_right(self.times, offset)
+        if index == 0:
+            return self.levels[0]
+        if index == len(self.times):
+            return self.levels[-1]
+
+        before, after = self.times[index - 1], self.times[index]
+        weight = (offset - before) / (after - before)
+        return self.levels[index - 1] + (self.levels[index] - self.levels[index - 1]) * weight
+
+    def rate(self, offset):
+        """
+        Relative rate at `offset` seconds into the run.
+
+        Returns:
+            float: The unscaled rate, never negative.
+        """
+        rate = self.level(offset)
+
+        if self.diurnal is not None:
+            amplitude, period, phase = self.diurnal
+            rate *= 1 + amplitude * math.cos(2 * math.pi * (offset + phase) / period)
+
+        # Bursts all last as long, so only the latest few can still be going on
+        index = bisect.bisect_right(self.burst_starts, offset) - 1
+        while index >= 0 and self.bursts[index][0] > offset - self.burst_length:
+            rate *= self.bursts[index][1]
+            index -= 1
+
+        return rate
+
+    def _build_table(self, resolution):
+        # Running integral of the rate, by the trapezoid rule, normalized to 1
+        self.step = self.duration / resolution
+
+        rates = [self.rate(index * self.step) for index in range(resolution + 1)]
+        table = [0.0]
+        for index in range(resolution):
+            table.append(table[-1] + (rates[index] + rates[index + 1]) * self.step / 2)
+
+        total = table[-1]
+        if total <= 0:
+            raise ValueError("A load profile needs a positive rate somewhere in the time range.")
+        # Packed doubles, 8 bytes per point instead of a float object each
+        self.table = array('d', [value / total for value in table])
+
+    def cumulative(self, offset):
+        """
+        Share of the budget that is due `offset` seconds into the run.
+
+        Returns:
+            float: A fraction between 0 and 1.
+        """
+        if offset <= 0:
+            return 0.0
+        if offset >= self.duration:
+            return 1.0
+
+        position = offset / self.step
+        index = min(int(position), len(self.table) - 2)
+        low, high = self.table[index], self.table[index + 1]
+        return low + (high - low) * (position - index)
+
+    def inverse(self, fraction):
+        """
+        Time at which a share of the budget is due, the inverse of
+        cumulative().
+
+        Returns:
+            float: Seconds into the run.
+        """
+        if fraction <= 0:
+            return 0.0
+        if fraction >= 1:
+            return self.duration
+
+        index = bisect.bisect_left(self.table, fraction)
+        low, high = self.table[index - 1], self.table[index]
+        share = (fraction - low) / (high - low) if high > low else 0.0
+        return (index - 1 + share) * self.step
+
+def create_profile(config, duration, start=None, rng=random, resolution=RESOLUTION):
+    """
+    Build the load profile of the "profile" section of the config.
+
+    Returns:
+        LoadProfile: The profile, or None when the config has none.
+    """
+    if not config.get("profile"):
+        return None
+
+    timezone = config.get("timezone", xml_handler.DEFAULT_TIMEZONE)
+    return LoadProfile(duration, start=start, timezone=timezone, rng=rng, resolution=resolution,
+                       **config["profile"])
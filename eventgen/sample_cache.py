@@ -0,0 +1,325 @@
+import hashlib
+import json
+import mmap
+import os
+import struct
+from array import array
+import parsers
+import templates
+import xml_handler
+
+# Cache file layout:
+#   MAGIC | records as compact JSON | padding to 8 bytes
+#   | record offsets (uint64, count + 1) | user of each record (uint32, count) | padding to 8 bytes
+#   | header JSON | header offset (uint64) | MAGIC
+MAGIC = b"EVGCACHE"
+
+# Bump when the layout changes, so caches get rebuilt
+CACHE_VERSION = 2
+FOOTER = struct.Struct("<Q8s")
+
+# Compiled templates file layout, one file per output format and set of slot fields:
+#   TEMPLATES_MAGIC | template format strings, UTF-8 | padding to 8 bytes
+#   | string offsets in characters (uint64, count + 1) | static sizes (uint32, count)
+#   | header JSON | header offset (uint64) | TEMPLATES_MAGIC
+TEMPLATES_MAGIC = b"EVGTMPLS"
+
+def cache_path(file_path, cache_dir):
+    key = hashlib.sha1(os.path.abspath(file_path).encode('utf-8')).hexdigest()[:16]
+    return os.path.join(cache_dir, f"{key}.cache")
+
+def templates_path(path, output_format, fields):
+    key = hashlib.sha1(json.dumps([output_format, list(fields)]).encode('utf-8')).hexdigest()[:16]
+    return f"{os.path.splitext(path)[0]}-{key}.templates"
+
+def source_key(file_path, sample_format="auto"):
+    # A directory changes when any of its audit files does
+    stats = [os.stat(source) for source in parsers.source_files(file_path)]
+    return {
+        "path": os.path.abspath(file_path),
+        "files": len(stats),
+        "size": sum(stat.st_size for stat in stats),
+        "mtime_ns": max(stat.st_mtime_ns for stat in stats),
+        "format": sample_format,
+        "parser_version": xml_handler.PARSER_VERSION,
+        "cache_version": CACHE_VERSION
+    }
+
+def build_cache(file_path, path, sample_format="auto", workers=None):
+    """
+    Parse a sample file, or a directory of audit files, and write its
+    records to a cache file.
+
+    The cache is written to a temporary file first and moved into
+    place, so readers never see a half-written cache.
+
+    Args:
+        file_path (str): Path to the sample file or directory.
+        path (str): Path of the cache file to write.
+        sample_format (str): Format of the samples, "auto" to detect it.
+        workers (int): Number of parser processes for a directory.
+    """
+    key = source_key(file_path, sample_format)
+    offsets = array('Q')
+    # Index into `users` of every record's userid, so sessions need not decode the records
+    users = {}
+    user_indices = array('I')
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    temp_path = f"{path}.{os.getpid()}.tmp"
+
+    with open(temp_path, 'wb') as f:
+        f.write(MAGIC)
+        position = len(MAGIC)
+
+        for record in parsers.iter_path(file_path, sample_format, workers):
+            data = json.dumps(record, separators=(',', ':')).encode('utf-8')
+            offsets.append(position)
+            f.write(data)
+            position += len(data)
+            user_indices.append(users.setdefault(record.get("userid", ""), len(users)))
+
+        offsets.append(position)
+
+        # Keep the offset table aligned for a memoryview cast
+        f.write(b"\0" * (-position % 8))
+
+        f.write(offsets.tobytes())
+        f.write(user_indices.tobytes())
+        f.write(b"\0" * (-len(user_indices) * 4 % 8))
+
+        header_offset = f.tell()
+        header = {"source": key, "count": len(offsets) - 1, "data_end": position, "users": list(users)}
+        f.write(json.dumps(header).encode('utf-8'))
+        f.write(FOOTER.pack(header_offset, MAGIC))
+
+    os.replace(temp_path, path)
+
+class SampleCache:
+    """
+    Read-only, memory-mapped view of a cache file built by build_cache.
+
+    Records are decoded on access, so opening a cache costs the same
+    no matter how many records it holds.
+
+    Args:
+        path (str): Path to the cache file.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, 'rb')
+        try:
+            self.mapped = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self.file.close()
+            raise ValueError(f"Invalid sample cache: {path}")
+
+        try:
+            if len(self.mapped) < len(MAGIC) + FOOTER.size or self.mapped[:len(MAGIC)] != MAGIC:
+                raise ValueError(f"Invalid sample cache: {path}")
+
+            header_offset, magic = FOOTER.unpack(self.mapped[-FOOTER.size:])
+            if magic != MAGIC:
+                raise ValueError(f"Invalid sample cache: {path}")
+
+            self.header = json.loads(self.mapped[header_offset:-FOOTER.size].decode('utf-8'))
+            # Caches of an older layout have no user table
+            if self.header["source"].get("cache_version") != CACHE_VERSION:
+                raise ValueError(f"Invalid sample cache: {path}")
+        except ValueError:
+            self.close()
+            raise
+
+        self.count = self.header["count"]
+        view = memoryview(self.mapped)
+        table = self.header["data_end"] + (-self.header["data_end"] % 8)
+
+        self.offsets = view[table:table + (self.count + 1) * 8].cast('Q')
+        table += (self.count + 1) * 8
+        self.user_indices = view[table:table + self.count * 4].cast('I')
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, index):
+        return json.loads(self.mapped[self.offsets[index]:self.offsets[index + 1]])
+
+    def records(self, indices=None):
+        if indices is None:
+            indices = range(self.count)
+        return [self[index] for index in indices]
+
+    def close(self):
+        # Views into the map must be released before it can be closed
+        if hasattr(self, "offsets"):
+            self.offsets.release()
+            self.user_indices.release()
+        self.mapped.close()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+def build_templates(cache, path, output_format, fields):
+    """
+    Compile the template of every record of a cache and write them to
+    a templates file, atomically like build_cache.
+
+    Args:
+        cache (SampleCache): The opened sample cache.
+        path (str): Path of the templates file to write.
+        output_format (str): Either "json" or "xml".
+        fields (tuple): Names of the fields filled in per event.
+    """
+    offsets = array('Q', [0])
+    sizes = array('I')
+    temp_path = f"{path}.{os.getpid()}.tmp"
+
+    with open(temp_path, 'wb') as f:
+        f.write(TEMPLATES_MAGIC)
+        position = len(TEMPLATES_MAGIC)
+
+        for index in range(len(cache)):
+            template = templates.EventTemplate(cache[index], output_format, fields)
+            data = template.format.encode('utf-8')
+            f.write(data)
+            position += len(data)
+            offsets.append(offsets[-1] + len(template.format))
+            sizes.append(template.size)
+
+        # Keep the tables aligned for memoryview casts
+        f.write(b"\0" * (-position % 8))
+        f.write(offsets.tobytes())
+        f.write(sizes.tobytes())
+        f.write(b"\0" * (-len(sizes) * 4 % 8))
+
+        header_offset = f.tell()
+        header = {"source": cache.header["source"], "version": templates.TEMPLATE_VERSION,
+                  "format": output_format, "fields": list(fields), "count": len(sizes), "data_end": position}
+        f.write(json.dumps(header).encode('utf-8'))
+        f.write(FOOTER.pack(header_offset, TEMPLATES_MAGIC))
+
+    os.replace(temp_path, path)
+
+def read_templates(path, cache, output_format, fields, indices):
+    """
+    Read the compiled templates of a cache, decoding all format strings
+    in one go.
+
+    Returns:
+        list: The EventTemplate of each index, None when the file is
+        missing or does not match the cache, format and fields.
+    """
+    if not os.path.exists(path):
+        return None
+
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        if len(mapped) < len(TEMPLATES_MAGIC) + FOOTER.size or mapped[:len(TEMPLATES_MAGIC)] != TEMPLATES_MAGIC:
+            return None
+        header_offset, magic = FOOTER.unpack(mapped[-FOOTER.size:])
+        if magic != TEMPLATES_MAGIC:
+            return None
+
+        header = json.loads(mapped[header_offset:-FOOTER.size].decode('utf-8'))
+        if header != {"source": cache.header["source"], "version": templates.TEMPLATE_VERSION,
+                      "format": output_format, "fields": list(fields), "count": len(cache),
+                      "data_end": header["data_end"]}:
+            return None
+
+        count = header["count"]
+        data_end = header["data_end"]
+        table = data_end + (-data_end % 8)
+        offsets = array('Q', mapped[table:table + (count + 1) * 8])
+        table += (count + 1) * 8
+        sizes = array('I', mapped[table:table + count * 4])
+        text = mapped[len(TEMPLATES_MAGIC):data_end].decode('utf-8')
+
+    compiled = templates.EventTemplate.from_compiled
+    return [compiled(text[offsets[index]:offsets[index + 1]], sizes[index], output_format, fields)
+            for index in indices]
+
+class CachedSamples:
+    """
+    The sample records of a cache, in replay order, decoded only when
+    accessed. Their compiled templates are kept next to the cache, one
+    file per output format and set of slot fields, so a warm start
+    reads the templates without decoding or serializing any record.
+
+    Args:
+        cache (SampleCache): The opened sample cache.
+        indices (range | list): Indices of the replayed records.
+    """
+
+    def __init__(self, cache, indices):
+        self.cache = cache
+        self.indices = indices
+
+    def __len__(self):
+        return len(self.indices)
+
+    def __getitem__(self, index):
+        return self.cache[self.indices[index]]
+
+    def __iter__(self):
+        for index in self.indices:
+            yield self.cache[index]
+
+    def users(self):
+        """
+        How often each user appears in the replayed records, read from
+        the user table of the cache without decoding any record.
+
+        Returns:
+            dict: User name -> number of records.
+        """
+        names = self.cache.header["users"]
+        counts = [0] * len(names)
+        user_indices = self.cache.user_indices
+        for index in self.indices:
+            counts[user_indices[index]] += 1
+        return {name: count for name, count in zip(names, counts) if count}
+
+    def templates(self, output_format, fields):
+        path = templates_path(self.cache.path, output_format, fields)
+        compiled = read_templates(path, self.cache, output_format, fields, self.indices)
+        if compiled is None and len(self.indices) < len(self.cache):
+            # A subset is compiled on its own rather than the whole corpus
+            return [templates.EventTemplate(record, output_format, fields) for record in self]
+        if compiled is None:
+            build_templates(self.cache, path, output_format, fields)
+            compiled = read_templates(path, self.cache, output_format, fields, self.indices)
+        return compiled
+
+def open_cache(file_path, cache_dir, sample_format="auto", workers=None):
+    """
+    Open the cache for a sample file, rebuilding it first when it is
+    missing or was built from a different version of the file or parser.
+
+    Args:
+        file_path (str): Path to the sample file or directory.
+        cache_dir (str): Directory that holds the cache files.
+        sample_format (str): Format of the samples, "auto" to detect it.
+        workers (int): Number of parser processes for a directory.
+
+    Returns:
+        SampleCache: The opened cache.
+    """
+    path = cache_path(file_path, cache_dir)
+
+    if os.path.exists(path):
+        try:
+            cache = SampleCache(path)
+        except ValueError:
+            cache = None
+
+        if cache is not None:
+            if cache.header["source"] == source_key(file_path, sample_format):
+                return cache
+            cache.close()
+
+    build_cache(file_path, path, sample_format, workers)
+    return SampleCache(path)
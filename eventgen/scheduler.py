@@ -0,0 +1,240 @@
+import time
+
+class RateScheduler:
+    """
+    Token bucket that paces generation to a target rate.
+
+    Tokens are units of work (events or bytes) and refill at `rate`
+    units per second of real elapsed time, so time spent serializing
+    and sending is not added on top of the pacing delay. After a stall
+    the bucket has refilled and the producer catches up, but never by
+    more than `burst` seconds worth of tokens.
+
+    Spending more tokens than are available puts the bucket in debt.
+    The scheduler only sleeps once the debt is worth at least
+    `min_sleep` seconds, so very high rates are paced with one sleep
+    per many events instead of one per event.
+
+    Args:
+        rate (float): Target rate in units per second.
+        burst (float): Seconds worth of tokens the bucket can hold.
+        min_sleep (float): Smallest debt, in seconds, worth sleeping for.
+    """
+
+    def __init__(self, rate, burst=1.0, min_sleep=0.002):
+        self.rate = rate
+        self.burst = burst
+        self.capacity = rate * burst
+        self.min_sleep = min_sleep
+        # Replaced by callers that have work to do while the producer waits
+        self.sleep = time.sleep
+        self.tokens = 0.0
+        self.consumed = 0
+        self.start = time.monotonic()
+        self.last = self.start
+        # Units due at the rates before the current one, and since when the current one holds
+        self.scheduled = 0.0
+        self.rate_since = self.start
+
+    def acquire(self, amount=1):
+        self.consumed += amount
+
+        # A non-positive rate means there is nothing to pace against
+        if self.rate <= 0:
+            return
+
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.last) * self.rate)
+        self.last = now
+        self.tokens -= amount
+
+        if self.tokens < 0:
+            wait = -self.tokens / self.rate
+            if wait >= self.min_sleep:
+                self.sleep(wait)
+
+    def set_rate(self, rate):
+        # Tokens earned so far are credited at the old rate
+        now = time.monotonic()
+        if self.rate > 0:
+            self.tokens = min(self.capacity, self.tokens + (now - self.last) * self.rate)
+        self.last = now
+
+        self.scheduled += (now - self.rate_since) * self.rate
+        self.rate_since = now
+        self.rate = rate
+        self.capacity = rate * self.burst
+
+    def due(self):
+        # Units the schedule has asked for so far, over every rate it had
+        return self.scheduled + (time.monotonic() - self.rate_since) * self.rate
+
+    def state(self):
+        return {"consumed": self.consumed, "rate": self.rate, "scheduled": self.due(),
+                "elapsed": time.monotonic() - self.start}
+
+    def restore(self, state):
+        # Continue the schedule where it stopped, the time in between is skipped
+        self.set_rate(state["rate"])
+        self.consumed = state["consumed"]
+        self.tokens = 0.0
+        self.last = time.monotonic()
+        self.start = self.last - state["elapsed"]
+        self.scheduled = state["scheduled"]
+        self.rate_since = self.last
+
+    def drift(self):
+        """
+        Compare the throughput achieved so far with the target.
+
+        Returns:
+            dict: Elapsed seconds, actual and target rates, and the
+            relative drift of the actual rate in percent.
+        """
+        elapsed = time.monotonic() - self.start
+        actual = self.consumed / elapsed if elapsed > 0 else 0.0
+        # The average of the target rates, when the rate was changed during the run
+        target = self.due() / elapsed if elapsed > 0 else self.rate
+        drift = (actual - target) / target * 100 if target > 0 else 0.0
+
+        return {"elapsed": elapsed, "actual_rate": actual, "target_rate": target, "drift_pct": drift}
+
+class ProfileScheduler:
+    """
+    Paces generation along a load profile instead of a flat rate.
+
+    `total` units (events or bytes) are spread over the time range in
+    the shape of the profile. After consuming some amount, the producer
+    sleeps until the profile says that amount is due. The due time is
+    only looked up once the producer may be `min_sleep` seconds ahead,
+    so most calls cost one comparison even at very high rates.
+
+    A producer that falls behind catches up at full speed, but never by
+    more than `burst` seconds; the rest of the schedule shifts instead.
+
+    Args:
+        profile (LoadProfile): Shape of the rate over the time range.
+        total (float): Units to spend over the whole time range.
+        burst (float): Seconds of backlog that may be caught up at once.
+        min_sleep (float): Shortest lead, in seconds, worth sleeping for.
+    """
+
+    def __init__(self, profile, total, burst=1.0, min_sleep=0.002):
+        self.profile = profile
+        self.total = total
+        self.burst = burst
+        self.min_sleep = min_sleep
+        self.sleep = time.sleep
+        self.consumed = 0
+        # Consumption that can be reached before the schedule is checked again
+        self.allowance = 0
+        self.start = time.monotonic()
+        # Seconds the schedule has been pushed back after stalls
+        self.shift = 0.0
+
+    @property
+    def rate(self):
+        return self.total / self.profile.duration
+
+    def acquire(self, amount=1):
+        self.consumed += amount
+        if self.consumed < self.allowance or self.total <= 0:
+            return
+
+        now = time.monotonic() - self.start - self.shift
+        due = self.profile.inverse(self.consumed / self.total)
+
+        if now - due > self.burst:
+            # Too far behind, give up on the time that cannot be caught up
+            self.shift += now - due - self.burst
+            now = due + self.burst
+
+        wait = due - now
+        if wait >= self.min_sleep:
+            self.sleep(wait)
+            now = due
+
+        self.allowance = self.total * self.profile.cumulative(now + self.min_sleep)
+
+    def set_rate(self, rate):
+        # Rescale the whole schedule to a new average rate
+        self.total = rate * self.profile.duration
+        self.allowance = 0
+
+    def state(self):
+        return {"consumed": self.consumed, "total": self.total, "shift": self.shift,
+                "elapsed": time.monotonic() - self.start}
+
+    def restore(self, state):
+        # Continue the schedule where it stopped, the time in between is skipped
+        self.consumed = state["consumed"]
+        self.total = state["total"]
+        self.shift = state["shift"]
+        self.allowance = 0
+        self.start = time.monotonic() - state["elapsed"]
+
+    def drift(self):
+        elapsed = time.monotonic() - self.start
+        actual = self.consumed / elapsed if elapsed > 0 else 0.0
+        # Average rate the profile asks for over the same stretch of time
+        target = self.total * self.profile.cumulative(elapsed - self.shift) / elapsed if elapsed > 0 else 0.0
+        drift = (actual - target) / target * 100 if target > 0 else 0.0
+
+        return {"elapsed": elapsed, "actual_rate": actual, "target_rate": target, "drift_pct": drift}
+
+class BackfillScheduler:
+    """
+    Spreads a run over a simulated time window instead of pacing it.
+
+    acquire() never sleeps, so a backfill runs as fast as the sinks take
+    events. The simulated clock moves from `start` to `start + duration`
+    as the budget is consumed, along the load profile when there is one.
+    Used as the clock of a TimestampSource, it stamps events across the
+    window.
+
+    Args:
+        total (float): Units (events or bytes) to spend over the window.
+        duration (float): Length of the window in seconds.
+        start (float): Start of the window in seconds since the epoch.
+        profile (LoadProfile): Shape of the rate over the window, None for flat.
+    """
+
+    def __init__(self, total, duration, start, profile=None):
+        self.total = total
+        self.duration = duration
+        self.window_start = start
+        self.profile = profile
+        self.consumed = 0
+        self.start = time.monotonic()
+
+    @property
+    def rate(self):
+        return self.total / self.duration
+
+    def acquire(self, amount=1):
+        self.consumed += amount
+
+    def clock(self):
+        # Simulated time at which the consumed share of the budget is due
+        fraction = min(1.0, self.consumed / self.total) if self.total > 0 else 1.0
+        if self.profile is None:
+            return self.window_start + fraction * self.duration
+        return self.window_start + self.profile.inverse(fraction)
+
+    def set_rate(self, rate):
+        self.total = rate * self.duration
+
+    def state(self):
+        return {"consumed": self.consumed, "total": self.total, "elapsed": time.monotonic() - self.start}
+
+    def restore(self, state):
+        self.consumed = state["consumed"]
+        self.total = state["total"]
+        self.start = time.monotonic() - state["elapsed"]
+
+    def drift(self):
+        # There is no target to drift from, the run goes as fast as it can
+        elapsed = time.monotonic() - self.start
+        actual = self.consumed / elapsed if elapsed > 0 else 0.0
+
+        return {"elapsed": elapsed, "actual_rate": actual, "target_rate": actual, "drift_pct": 0.0}
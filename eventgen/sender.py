@@ -0,0 +1,281 @@
+import gzip
+import queue
+import random
+import threading
+import time
+import zlib
+from email.utils import parsedate_to_datetime
+import requests
+from requests.adapters import HTTPAdapter
+from spool import Spool
+
+COMPRESSORS = {
+    None: None,
+    "gzip": lambda body, level: gzip.compress(body, compresslevel=level),
+    "deflate": lambda body, level: zlib.compress(body, level)
+}
+
+# Responses worth trying again, anything else non-200 is a permanent failure
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+def retry_after(response):
+    """
+    Read the delay a server asked for in its Retry-After header.
+
+    Args:
+        response (requests.Response): The failed response, or None.
+
+    Returns:
+        float: Seconds to wait, or None when the header is missing or invalid.
+    """
+    value = response.headers.get('Retry-After') if response is not None else None
+    if not value:
+        return None
+
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+class Sender:
+    """
+    Pool of sender threads that POST request bodies over a shared,
+    keep-alive requests.Session.
+
+    Bodies are handed over through a bounded queue, so the producer can
+    keep generating events while earlier requests are still in flight.
+    Without a spool the producer blocks once the queue is full.
+
+    Bodies can be compressed with gzip or deflate. Compression runs in
+    the sender threads, off the generation thread, and sets the
+    Content-Encoding header. It pays off most with multi-event bodies.
+
+    Requests that fail with 429, 5xx or a connection error are retried
+    with exponential backoff and full jitter, waiting at least as long
+    as the server's Retry-After header asks for. With a spool file
+    configured, bodies that still fail, and bodies that find the queue
+    full, are appended to the spool instead of blocking the producer.
+    A drain thread feeds them back once the endpoint recovers.
+
+    Args:
+        threads (int): Number of sender threads.
+        pool_size (int): Maximum number of pooled connections per host.
+        queue_size (int): Maximum number of bodies waiting to be sent.
+        compression (str): None, "gzip" or "deflate".
+        compresslevel (int): Compression level, 1 (fastest) to 9 (smallest).
+        max_retries (int): Retries per request after the first attempt.
+        backoff (float): Base delay in seconds for the first retry.
+        max_backoff (float): Upper bound of a single backoff delay.
+        spool (str): Path of the spool file, None to disable spooling.
+        drain_timeout (float): Seconds close() waits for the spool to drain.
+        metrics (Metrics): Where to record send latency, status codes and
+            queue depth, None to not record them.
+    """
+
+    def __init__(self, threads=4, pool_size=8, queue_size=1000, compression=None, compresslevel=6,
+                 max_retries=5, backoff=0.5, max_backoff=30.0, spool=None, drain_timeout=60.0,
+                 metrics=None):
+        if compression not in COMPRESSORS:
+            raise ValueError("Invalid compression. Use 'gzip' or 'deflate'.")
+
+        self.compress = COMPRESSORS[compression]
+        self.encoding = compression
+        self.compresslevel = compresslevel
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.drain_timeout = drain_timeout
+        # Backoff jitter has its own generator, so sending never disturbs a seeded run
+        self.rng = random.Random()
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+        self.queue = queue.Queue(maxsize=queue_size)
+
+        # The spool holds no credentials, they are kept here per URL
+        self.spool = Spool(spool) if spool else None
+        self.authorization = {}
+        # Spooled bodies are held back until this time after a failure
+        self.resume_at = 0.0
+        self.stopping = threading.Event()
+
+        self.metrics = metrics
+        self.profiler = metrics.profiler if metrics is not None else None
+        if metrics is not None:
+            metrics.gauge("eventgen_queue_depth", "Request bodies waiting to be sent.", function=self.queue.qsize)
+            metrics.gauge("eventgen_spooled_events", "Events waiting in the spool file.", function=self.spooled)
+
+        # One stats record per worker, so workers never share a counter
+        self.stats = [{"requests": 0, "events": 0, "failed": 0, "failed_events": 0,
+                       "bytes": 0, "wire_bytes": 0, "retries": 0, "spooled_events": 0}
+                      for _ in range(threads)]
+
+        self.workers = []
+        for index in range(threads):
+            worker = threading.Thread(target=self._run, args=(index,),
+                                      name=f"sender-{index}", daemon=True)
+            worker.start()
+            self.workers.append(worker)
+
+        self.drainer = None
+        if self.spool is not None:
+            self.drainer = threading.Thread(target=self._drain, name="sender-drain", daemon=True)
+            self.drainer.start()
+
+    def submit(self, url, headers, body, count=1):
+        if self.spool is None:
+            # Blocks when the queue is full, which throttles the producer
+            self.queue.put((url, headers, body, count, None))
+            return
+
+        self.authorization[url] = headers.get('Authorization')
+        try:
+            self.queue.put_nowait((url, headers, body, count, None))
+        except queue.Full:
+            # Keep generating at the target rate and send these later
+            self.spool.append(url, headers, body, count)
+
+    def _delay(self, attempt, response):
+        delay = self.rng.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+        requested = retry_after(response)
+        if requested is not None:
+            delay = max(delay, requested)
+        return delay
+
+    def _observe(self, started, status):
+        if self.metrics is not None:
+            self.metrics.send_latency.observe(time.perf_counter() - started)
+            self.metrics.responses.inc(1, status)
+
+    def _post(self, url, headers, body, stats):
+        """
+        POST a body, retrying transient failures.
+
+        Returns:
+            bool: True once delivered, False on a permanent failure, and
+            None when the endpoint kept failing until retries ran out.
+        """
+        response = None
+        for attempt in range(self.max_retries + 1):
+            started = time.perf_counter()
+            try:
+                response = self.session.post(url, headers=headers, data=body)
+                self._observe(started, str(response.status_code))
+                if response.status_code == 200:
+                    return True
+                if response.status_code not in RETRY_STATUSES:
+                    return False
+            except requests.RequestException:
+                self._observe(started, "error")
+                response = None
+
+            if attempt == self.max_retries or self.stopping.is_set():
+                break
+
+            delay = self._delay(attempt, response)
+            self.resume_at = max(self.resume_at, time.monotonic() + delay)
+            stats["retries"] += 1
+            time.sleep(delay)
+
+        # Hold spooled data back for a while before trying the endpoint again
+        self.resume_at = max(self.resume_at, time.monotonic() + self._delay(self.max_retries, response))
+        return None
+
+    def _run(self, index):
+        stats = self.stats[index]
+
+        while True:
+            item = self.queue.get()
+            if item is None:
+                self.queue.task_done()
+                break
+
+            # Position is where the body sits in the spool, None when it was never spooled
+            url, headers, body, count, position = item
+            size = len(body)
+
+            if self.compress is not None:
+                started = time.perf_counter()
+                body = self.compress(body, self.compresslevel)
+                headers = dict(headers)
+                headers['Content-Encoding'] = self.encoding
+                if self.profiler is not None:
+                    self.profiler.add("compress", time.perf_counter() - started)
+
+            delivered = self._post(url, headers, body, stats)
+
+            if delivered:
+                stats["requests"] += 1
+                stats["events"] += count
+                stats["bytes"] += size
+                stats["wire_bytes"] += len(body)
+            elif delivered is None and self.spool is not None:
+                # Spool the original body, it is compressed again when resent
+                self.spool.append(url, item[1], item[2], count)
+                stats["spooled_events"] += count
+            else:
+                stats["failed"] += 1
+                stats["failed_events"] += count
+
+            # Only now can the spool let go of the body
+            if position is not None:
+                self.spool.done(position)
+
+            self.queue.task_done()
+
+    def _drain(self):
+        while not self.stopping.is_set():
+            # Only feed spooled bodies back while the endpoint is healthy,
+            # the queue has room, and credentials are known
+            if (not len(self.spool) or not self.authorization
+                    or time.monotonic() < self.resume_at
+                    or self.queue.qsize() >= self.queue.maxsize // 2):
+                self.stopping.wait(0.1)
+                continue
+
+            item = self.spool.pop()
+            if item is None:
+                continue
+
+            url, headers, body, count, position = item
+            authorization = self.authorization.get(url)
+            if authorization:
+                headers['Authorization'] = authorization
+
+            self.queue.put((url, headers, body, count, position))
+
+    def flush(self):
+        # Wait until every body handed over so far is sent or spooled
+        self.queue.join()
+
+    def close(self):
+        # Give the spool a chance to drain before shutting down
+        if self.spool is not None:
+            deadline = time.monotonic() + self.drain_timeout
+            while (len(self.spool) or self.queue.unfinished_tasks) and time.monotonic() < deadline:
+                time.sleep(0.1)
+
+            self.stopping.set()
+            self.drainer.join()
+
+        # Wait for queued bodies to go out, then stop the workers
+        for _ in self.workers:
+            self.queue.put(None)
+        for worker in self.workers:
+            worker.join()
+        self.session.close()
+
+        if self.spool is not None:
+            self.spool.close()
+
+    def spooled(self):
+        # Events still waiting in the spool file
+        return len(self.spool) if self.spool is not None else 0
@@ -0,0 +1,175 @@
+import array
+import base64
+import random
+from synth import AliasTable
+
+# Fields the simulator fills in per event, after the timestamp
+SESSION_FIELDS = ("sessionid", "entryid", "userid")
+
+# Template indexes of the logon and logoff records, statements follow
+LOGON, LOGOFF = 0, 1
+
+# Session states
+FREE, ACTIVE = 0, 1
+
+def session_records(sample):
+    """
+    Logon and logoff audit records modeled on a sample record.
+
+    Args:
+        sample (dict): A parsed audit record.
+
+    Returns:
+        list: The logon and the logoff record, in that order.
+    """
+    records = []
+    for action, comment in (("LOGON", "Authenticated by: DATABASE;"), ("LOGOFF", "")):
+        record = dict(sample)
+        record.update(action=action, returncode="0")
+        for field, value in (("comment$text", comment), ("object_schema", ""),
+                             ("object_name", ""), ("sql_text", "")):
+            if field in record:
+                record[field] = value
+        records.append(record)
+    return records
+
+class SessionSimulator:
+    """
+    Keeps the state of many concurrent database sessions in compact
+    arrays and walks each of them through logon, a number of statements
+    and logoff.
+
+    A session takes 17 bytes: its id, current entry id, user, number of
+    statements left and state. A tick advances randomly chosen sessions
+    by one audit record each; a free slot starts a new session with a
+    logon, and a session without statements left logs off and frees its
+    slot. Entry ids increase within a session, session ids across them.
+
+    Args:
+        count (int): Number of session slots, i.e. concurrent sessions.
+        users (list | dict): User names, or user name -> weight.
+        statement_templates (int): Number of statement templates, which
+            come after the logon and logoff templates.
+        escape (callable): Escapes a value for the output format.
+        statements (list): Smallest and largest number of statements per session.
+        first_id (int): Id of the first session.
+        rng (random.Random): Source of randomness.
+    """
+
+    def __init__(self, count, users, statement_templates, escape, statements=(1, 20), first_id=1,
+                 rng=random):
+        if count <= 0:
+            raise ValueError("The session count must be positive.")
+        if not statement_templates:
+            raise ValueError("Sessions need at least one statement sample.")
+        if not 0 < statements[0] <= statements[1] <= 0xFFFF:
+            raise ValueError("Invalid statements range. Use [min, max] with 0 < min <= max <= 65535.")
+
+        if isinstance(users, dict):
+            weights = list(users.values())
+            users = list(users)
+        else:
+            weights = [1] * len(users)
+        if not users or len(users) > 0xFFFF:
+            raise ValueError("Sessions need between 1 and 65535 users.")
+
+        self.count = count
+        self.rng = rng
+        self.statements = statements
+        self.statement_templates = statement_templates
+        self.next_id = first_id
+
+        self.user_names = [escape(str(user)) for user in users]
+        self.user_table = AliasTable(list(range(len(users))), weights)
+        self.ascii = all(name.isascii() for name in self.user_names)
+
+        # Zero-filled, every slot starts out FREE
+        self.session_ids = array.array('Q', bytes(8 * count))
+        self.entry_ids = array.array('I', bytes(4 * count))
+        self.users = array.array('H', bytes(2 * count))
+        self.remaining = array.array('H', bytes(2 * count))
+        self.states = array.array('B', bytes(count))
+
+    def state(self):
+        # The session arrays as base64, for checkpoints
+        arrays = (self.session_ids, self.entry_ids, self.users, self.remaining, self.states)
+        return {"next_id": self.next_id,
+                "arrays": [base64.b64encode(values.tobytes()).decode('ascii') for values in arrays]}
+
+    def restore(self, state):
+        self.next_id = state["next_id"]
+        arrays = (self.session_ids, self.entry_ids, self.users, self.remaining, self.states)
+        for values, encoded in zip(arrays, state["arrays"]):
+            data = base64.b64decode(encoded)
+            if len(data) != len(values) * values.itemsize:
+                raise ValueError("Invalid session state. The session count changed.")
+            values[:] = array.array(values.typecode, data)
+
+    def tick(self, count):
+        """
+        Advance `count` randomly chosen sessions by one record each.
+
+        Returns:
+            list: (template index, (sessionid, entryid, userid)) per
+            record, with the values escaped for the output format.
+        """
+        rng = self.rng
+        randrange = rng.randrange
+        uniform = rng.random
+        session_ids, entry_ids, users = self.session_ids, self.entry_ids, self.users
+        remaining, states = self.remaining, self.states
+        user_names = self.user_names
+        low, high = self.statements
+        span = high - low + 1
+        first_statement = LOGOFF + 1
+        statement_templates = self.statement_templates
+        # Users for the sessions that may start during this tick
+        new_users = self.user_table.draw(count, rng)
+
+        steps = []
+        for _ in range(count):
+            slot = randrange(self.count)
+
+            if states[slot] == FREE:
+                session_ids[slot] = self.next_id
+                self.next_id += 1
+                entry_ids[slot] = 1
+                users[slot] = new_users.pop()
+                remaining[slot] = low + int(uniform() * span)
+                states[slot] = ACTIVE
+                template = LOGON
+            elif remaining[slot]:
+                entry_ids[slot] += 1
+                remaining[slot] -= 1
+                template = first_statement + int(uniform() * statement_templates)
+            else:
+                entry_ids[slot] += 1
+                states[slot] = FREE
+                template = LOGOFF
+
+            steps.append((template, (str(session_ids[slot]), str(entry_ids[slot]), user_names[users[slot]])))
+
+        return steps
+
+def create_simulator(config, samples, escape, rng=random):
+    """
+    Build the session simulator of the "sessions" section of the config.
+    Without a "users" setting, users are drawn as often as they appear
+    in the samples, counted from the user table of the sample cache when
+    the samples come from one.
+
+    Returns:
+        SessionSimulator: The simulator.
+    """
+    options = dict(config)
+    if "users" not in options and hasattr(samples, "users"):
+        options["users"] = samples.users()
+    elif "users" not in options:
+        users = {}
+        for sample in samples:
+            user = sample.get("userid", "")
+            users[user] = users.get(user, 0) + 1
+        options["users"] = users
+
+    return SessionSimulator(options.pop("count", 10000), options.pop("users"), len(samples), escape,
+                            rng=rng, **options)
@@ -0,0 +1,580 @@
+import gzip
+import json
+import os
+import socket
+import sys
+import time
+import parser_emulator
+from sender import Sender
+
+def build_headers(content_type, config):
+    return {
+        'Content-Type': content_type,
+        'Authorization': f'Bearer {config["auth_token"]}'
+    }
+
+def new_stats():
+    return {"requests": 0, "events": 0, "failed": 0, "failed_events": 0, "bytes": 0, "wire_bytes": 0}
+
+class HttpSink:
+    """
+    Sends each batch as one newline-delimited POST to the webhook URL,
+    through a pool of keep-alive sender threads. Several sinks can share
+    one sender, and with it its threads and connections; a shared sender
+    is left open when the sink is closed.
+    """
+
+    label = "Sender"
+
+    def __init__(self, config, metrics=None, sender=None):
+        self.url = config["webhook_url"]
+        self.config = config
+        self.shared = sender is not None
+        self.sender = sender if self.shared else Sender(**config.get("sender", {}), metrics=metrics)
+
+    @property
+    def stats(self):
+        return self.sender.stats
+
+    def spooled(self):
+        return self.sender.spooled()
+
+    def write(self, events, content_type):
+        headers = build_headers(content_type, self.config)
+        body = "\n".join(events).encode('utf-8')
+        self.sender.submit(self.url, headers, body, len(events))
+
+    def checkpoint(self):
+        # Everything generated so far is sent or spooled before the checkpoint
+        self.sender.flush()
+        return {"stats": self.sender.stats}
+
+    def restore(self, state):
+        for stats, saved in zip(self.sender.stats, state["stats"]):
+            stats.update(saved)
+
+    def close(self):
+        if not self.shared:
+            self.sender.close()
+
+class BufferedSink:
+    """
+    Base class for sinks that write newline-terminated events to a byte
+    stream. Events are collected in memory and written in chunks of at
+    least `buffer_size` bytes, so a write call covers many events.
+
+    Subclasses implement _emit(data) to write one chunk and return the
+    number of bytes that actually went out, or _emit_chunks(chunks) to
+    write the buffered byte strings without joining them first.
+    """
+
+    label = "Sink"
+
+    def __init__(self, buffer_size=1024**2):
+        self.buffer_size = buffer_size
+        self.buffer = []
+        self.buffered = 0
+        self.buffered_events = 0
+        self.stats = [new_stats()]
+
+    def write(self, events, content_type):
+        data = ("\n".join(events) + "\n").encode('utf-8')
+        self.buffer.append(data)
+        self.buffered += len(data)
+        self.buffered_events += len(events)
+
+        if self.buffered >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        if not self.buffer:
+            return
+
+        chunks = self.buffer
+        size = self.buffered
+        events = self.buffered_events
+        self.buffer = []
+        self.buffered = 0
+        self.buffered_events = 0
+
+        stats = self.stats[0]
+        try:
+            wire_bytes = self._emit_chunks(chunks)
+            stats["requests"] += 1
+            stats["events"] += events
+            stats["bytes"] += size
+            stats["wire_bytes"] += wire_bytes
+        except OSError as e:
+            print(f"Failed to write {events} events: {e}", file=sys.stderr)
+            stats["failed"] += 1
+            stats["failed_events"] += events
+
+    def _emit_chunks(self, chunks):
+        # Sinks that can write a list of buffers at once override this
+        return self._emit(b"".join(chunks))
+
+    def _emit(self, data):
+        raise NotImplementedError
+
+    def checkpoint(self):
+        """
+        Write out the buffered events for a checkpoint of the run.
+
+        Returns:
+            dict: The state restore() continues from.
+        """
+        self.flush()
+        return {"stats": self.stats}
+
+    def restore(self, state):
+        self.stats = [dict(stats) for stats in state["stats"]]
+
+    def spooled(self):
+        return 0
+
+    def close(self):
+        self.flush()
+
+class FileSink(BufferedSink):
+    """
+    Writes events to local files, one event per line, optionally gzip
+    compressed. Once a file reaches `max_bytes` on disk, a new file is
+    started: events.log becomes events-00000.log, events-00001.log, ...
+
+    Args:
+        path (str): Base path of the output files.
+        max_bytes (int): Size at which to rotate, 0 to never rotate.
+        compress (bool): Write gzip files (".gz" is appended to the name).
+        compresslevel (int): gzip compression level.
+        buffer_size (int): Bytes collected before each write.
+    """
+
+    def __init__(self, path, max_bytes=0, compress=False, compresslevel=6, buffer_size=1024**2):
+        super().__init__(buffer_size)
+        self.path = path
+        self.max_bytes = max_bytes
+        self.compress = compress
+        self.compresslevel = compresslevel
+        self.index = 0
+        self.raw = None
+        self.file = None
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._open()
+
+    def current_path(self):
+        base, ext = os.path.splitext(self.path)
+        name = f"{base}-{self.index:05d}{ext}" if self.max_bytes else self.path
+        return f"{name}.gz" if self.compress else name
+
+    def _open(self):
+        self.raw = open(self.current_path(), 'ab')
+        # Where this run started writing to the file
+        self.opened_at = self.raw.tell()
+        self._start_member()
+
+    def _start_member(self):
+        if self.compress:
+            position = self.raw.tell()
+            self.file = gzip.GzipFile(fileobj=self.raw, mode='ab', compresslevel=self.compresslevel)
+            # Count the gzip header as well
+            self.stats[0]["wire_bytes"] += self.raw.tell() - position
+        else:
+            self.file = self.raw
+
+    def _close_file(self):
+        if self.file is not self.raw:
+            # Closing the compressor writes out what it still holds
+            position = self.raw.tell()
+            self.file.close()
+            self.stats[0]["wire_bytes"] += self.raw.tell() - position
+        self.raw.close()
+
+    def _emit(self, data):
+        position = self.raw.tell()
+        self.file.write(data)
+        # With gzip this counts what the compressor has flushed so far
+        written = self.raw.tell() - position
+
+        if self.max_bytes and self.raw.tell() >= self.max_bytes:
+            self._close_file()
+            self.index += 1
+            self._open()
+
+        return written
+
+    def checkpoint(self):
+        """
+        Write out the buffered events and sync the file, ending the gzip
+        member when compressing, so the file can be cut back to this
+        point on resume.
+
+        Returns:
+            dict: Stats, file index and offset.
+        """
+        self.flush()
+
+        if self.file is not self.raw:
+            position = self.raw.tell()
+            self.file.close()
+            self.stats[0]["wire_bytes"] += self.raw.tell() - position
+
+        self.raw.flush()
+        os.fsync(self.raw.fileno())
+        state = {"stats": self.stats, "index": self.index, "offset": self.raw.tell()}
+
+        if self.file is not self.raw:
+            self._start_member()
+        return state
+
+    def restore(self, state):
+        # Undo the opening of a new file, then cut the checkpointed one back to its offset
+        path = self.current_path()
+        self._close_file()
+        if self.opened_at:
+            os.truncate(path, self.opened_at)
+        else:
+            os.remove(path)
+
+        super().restore(state)
+        # Files rotated in after the checkpoint are written again from scratch
+        if self.max_bytes:
+            self.index = state["index"] + 1
+            while os.path.exists(self.current_path()):
+                os.remove(self.current_path())
+                self.index += 1
+
+        self.index = state["index"]
+        if os.path.exists(self.current_path()):
+            os.truncate(self.current_path(), state["offset"])
+        self._open()
+
+    def close(self):
+        super().close()
+        self._close_file()
+
+class StdoutSink(BufferedSink):
+    """Writes events to standard output, one event per line."""
+
+    def __init__(self, buffer_size=64 * 1024):
+        super().__init__(buffer_size)
+
+    def _emit(self, data):
+        sys.stdout.buffer.write(data)
+        return len(data)
+
+    def close(self):
+        super().close()
+        sys.stdout.buffer.flush()
+
+class TcpSink(BufferedSink):
+    """
+    Sends events as newline-delimited lines over one TCP connection.
+    The connection is reopened on the next write after an error.
+
+    Args:
+        host (str): Collector host name or address.
+        port (int): Collector port.
+        timeout (float): Connect and send timeout in seconds.
+        buffer_size (int): Bytes collected before each send.
+    """
+
+    def __init__(self, host, port, timeout=10.0, buffer_size=256 * 1024):
+        super().__init__(buffer_size)
+        self.address = (host, port)
+        self.timeout = timeout
+        self.socket = None
+
+    def _emit(self, data):
+        if self.socket is None:
+            self.socket = socket.create_connection(self.address, timeout=self.timeout)
+
+        try:
+            self.socket.sendall(data)
+        except OSError:
+            self.socket.close()
+            self.socket = None
+            raise
+
+        return len(data)
+
+    def close(self):
+        super().close()
+        if self.socket is not None:
+            self.socket.close()
+            self.socket = None
+
+# Syslog facility and severity codes by name, RFC 5424 section 6.2.1
+FACILITIES = {"kern": 0, "user": 1, "daemon": 3, "auth": 4, "syslog": 5, "authpriv": 10,
+              **{f"local{number}": 16 + number for number in range(8)}}
+SEVERITIES = {"emerg": 0, "alert": 1, "crit": 2, "err": 3, "warning": 4, "notice": 5, "info": 6, "debug": 7}
+
+# Most buffers a single sendmsg call takes
+try:
+    IOV_MAX = os.sysconf("SC_IOV_MAX")
+except (AttributeError, ValueError, OSError):
+    IOV_MAX = 1024
+
+class SyslogSink(BufferedSink):
+    """
+    Sends events as RFC 5424 syslog messages over TCP or UDP.
+
+    Every event gets a syslog header, whose timestamp is formatted at
+    most once per millisecond. Over TCP, messages are framed with octet
+    counting ("LEN MSG", RFC 6587) or end with a newline, and buffered
+    frames go out in as few sendmsg calls as possible, without being
+    joined first. Over UDP, every message is a datagram of its own,
+    without framing (RFC 5426). Newline terminated messages may instead
+    be packed into datagrams of up to `mtu` bytes, each sent with one
+    sendmsg call. After a send error the
+    connection is reopened with exponential backoff, and the frames that
+    were not completely sent are sent again.
+
+    Args:
+        host (str): Collector host name or address.
+        port (int): Collector port.
+        protocol (str): "tcp" or "udp".
+        framing (str): "octet" for octet counting, "lf" for newline
+            terminated messages, or "none" for one message per UDP
+            datagram. By default "octet" over TCP and "none" over UDP.
+        facility (str | int): Syslog facility, a name or its code.
+        severity (str | int): Syslog severity, a name or its code.
+        app_name (str): APP-NAME of the header.
+        hostname (str): HOSTNAME of the header, this host by default.
+        msgid (str): MSGID of the header.
+        mtu (int): Largest UDP datagram payload in bytes.
+        retries (int): Reconnects before a buffer is given up.
+        backoff (float): Seconds before the first reconnect, doubled on
+            every further attempt.
+        max_backoff (float): Longest wait between reconnects.
+        timeout (float): Connect and send timeout in seconds.
+        buffer_size (int): Bytes collected before each send.
+    """
+
+    def __init__(self, host, port, protocol="tcp", framing=None, facility="local1", severity="info",
+                 app_name="oracle", hostname=None, msgid="AUDIT", mtu=1472, retries=5, backoff=0.5,
+                 max_backoff=30.0, timeout=10.0, buffer_size=256 * 1024):
+        super().__init__(buffer_size)
+        if protocol not in ("tcp", "udp"):
+            raise ValueError("Invalid syslog protocol. Use 'tcp' or 'udp'.")
+        if framing is None:
+            framing = "octet" if protocol == "tcp" else "none"
+        # Stream messages need framing to be told apart, datagrams must not carry a length prefix
+        if protocol == "tcp" and framing not in ("octet", "lf"):
+            raise ValueError("Invalid syslog framing for TCP. Use 'octet' or 'lf'.")
+        if protocol == "udp" and framing not in ("none", "lf"):
+            raise ValueError("Invalid syslog framing for UDP. Use 'none' or 'lf'.")
+
+        self.address = (host, port)
+        self.protocol = protocol
+        self.framing = framing
+        self.mtu = mtu
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.timeout = timeout
+        self.socket = None
+        # Buffers of the current flush that went out completely
+        self.completed = 0
+
+        facility = FACILITIES.get(facility, facility)
+        severity = SEVERITIES.get(severity, severity)
+        if facility not in range(24) or severity not in range(8):
+            raise ValueError("Invalid syslog facility or severity. Use a name or code from RFC 5424.")
+        priority = facility * 8 + severity
+        hostname = hostname or socket.gethostname() or "-"
+        # Everything of the header but the timestamp, e.g. "<142>1 " and " db01 oracle - AUDIT - "
+        self.prefix = f"<{priority}>1 "
+        self.suffix = f" {hostname} {app_name} {os.getpid()} {msgid} - "
+        self.header = ""
+        self.header_time = None
+
+    def _header(self):
+        # RFC 3339 timestamp in UTC with milliseconds, reused within the same millisecond
+        milliseconds = int(time.time() * 1000)
+        if milliseconds != self.header_time:
+            seconds, fraction = divmod(milliseconds, 1000)
+            self.header = (f"{self.prefix}{time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(seconds))}"
+                           f".{fraction:03d}Z{self.suffix}")
+            self.header_time = milliseconds
+        return self.header
+
+    def write(self, events, content_type):
+        header = self._header()
+        header_size = len(header.encode('utf-8'))
+
+        if self.framing == "octet":
+            # The count is in bytes, so only non-ASCII events need encoding to measure
+            frames = [f"{header_size + (len(event) if event.isascii() else len(event.encode('utf-8')))} "
+                      f"{header}{event}" for event in events]
+            end = ""
+        elif self.framing == "lf":
+            frames = [f"{header}{event}" for event in events]
+            end = "\n"
+        else:
+            frames = [f"{header}{event}" for event in events]
+            end = ""
+
+        if self.protocol == "tcp":
+            # One buffer per write, frames are only split at buffer boundaries
+            data = ("\n".join(frames) + "\n" if end else "".join(frames)).encode('utf-8')
+            self.buffer.append(data)
+            self.buffered += len(data)
+        else:
+            # One buffer per message, so datagrams can be packed at message boundaries
+            for frame in frames:
+                data = f"{frame}{end}".encode('utf-8')
+                self.buffer.append(data)
+                self.buffered += len(data)
+        self.buffered_events += len(events)
+
+        if self.buffered >= self.buffer_size:
+            self.flush()
+
+    def _connect(self):
+        # Open the socket, waiting twice as long after every failed attempt
+        delay = self.backoff
+        for attempt in range(self.retries + 1):
+            try:
+                if self.protocol == "tcp":
+                    self.socket = socket.create_connection(self.address, timeout=self.timeout)
+                else:
+                    family, kind, proto, _, address = socket.getaddrinfo(*self.address, type=socket.SOCK_DGRAM)[0]
+                    self.socket = socket.socket(family, kind, proto)
+                    self.socket.settimeout(self.timeout)
+                    self.socket.connect(address)
+                return
+            except OSError:
+                if attempt == self.retries:
+                    raise
+                time.sleep(delay)
+                delay = min(delay * 2, self.max_backoff)
+
+    def _disconnect(self):
+        if self.socket is not None:
+            self.socket.close()
+            self.socket = None
+
+    def _send_stream(self, chunks):
+        # Gather up to IOV_MAX buffers per call, resuming after partial sends
+        chunk = 0
+        offset = 0
+        while chunk < len(chunks):
+            buffers = chunks[chunk:chunk + IOV_MAX]
+            if offset:
+                buffers[0] = memoryview(buffers[0])[offset:]
+            sent = self.socket.sendmsg(buffers)
+
+            sent += offset
+            while chunk < len(chunks) and sent >= len(chunks[chunk]):
+                sent -= len(chunks[chunk])
+                chunk += 1
+            offset = sent
+            self.completed = chunk
+
+    def _send_datagrams(self, chunks):
+        if self.framing == "none":
+            # One message per datagram
+            for index, data in enumerate(chunks):
+                self.socket.send(data)
+                self.completed = index + 1
+            return
+
+        # Pack whole messages into datagrams of up to `mtu` bytes
+        datagram = []
+        size = 0
+        for index, data in enumerate(chunks):
+            if datagram and size + len(data) > self.mtu:
+                self.socket.sendmsg(datagram)
+                self.completed = index
+                datagram = []
+                size = 0
+            datagram.append(data)
+            size += len(data)
+        if datagram:
+            self.socket.sendmsg(datagram)
+
+    def _emit_chunks(self, chunks):
+        send = self._send_stream if self.protocol == "tcp" else self._send_datagrams
+        size = sum(len(data) for data in chunks)
+        for attempt in range(self.retries + 1):
+            if self.socket is None:
+                self._connect()
+            self.completed = 0
+            try:
+                send(chunks)
+                return size
+            except OSError:
+                self._disconnect()
+                if attempt == self.retries:
+                    raise
+                # Send again what did not go out completely, on a new connection
+                chunks = chunks[self.completed:]
+
+    def close(self):
+        super().close()
+        self._disconnect()
+
+class ValidateSink(BufferedSink):
+    """
+    Checks events against the SIEM parser definition instead of sending
+    them, and prints the report of parser_emulator when closed. Events
+    are checked a buffer at a time.
+
+    Args:
+        parser (str): Path to the parser definition.
+        report (str): Also write the report as JSON to this file.
+        buffer_size (int): Bytes collected before each check.
+    """
+
+    def __init__(self, parser=parser_emulator.DEFAULT_PARSER, report=None, buffer_size=1024**2):
+        super().__init__(buffer_size)
+        self.validator = parser_emulator.Validator(parser_emulator.load_definition(parser))
+        self.report_path = report
+
+    def _emit(self, data):
+        # The buffer holds newline-terminated events
+        self.validator.check(data.decode('utf-8').split("\n")[:-1])
+        return len(data)
+
+    def close(self):
+        super().close()
+        report = self.validator.report()
+        parser_emulator.print_report(report, file=sys.stderr)
+        if self.report_path:
+            with open(self.report_path, 'w') as f:
+                json.dump(report, f, indent=2)
+
+def create_sink(config, metrics=None, sender=None):
+    """
+    Create the output sink selected by the "sink" section of the config.
+    Without one, events are sent to the webhook URL over HTTP.
+
+    Args:
+        config (dict): Configuration settings.
+        metrics (Metrics): Metrics of the run, used by the HTTP sink.
+        sender (Sender): Sender the HTTP sink shares with other sinks.
+
+    Returns:
+        The sink.
+    """
+    sink_config = dict(config.get("sink", {}))
+    kind = sink_config.pop("type", "http")
+
+    if kind == "http":
+        return HttpSink(config, metrics, sender)
+    elif kind == "file":
+        return FileSink(**sink_config)
+    elif kind == "stdout":
+        return StdoutSink(**sink_config)
+    elif kind == "tcp":
+        return TcpSink(**sink_config)
+    elif kind == "syslog":
+        return SyslogSink(**sink_config)
+    elif kind == "validate":
+        return ValidateSink(**sink_config)
+    else:
+        raise ValueError("Invalid sink type. Use 'http', 'file', 'stdout', 'tcp', 'syslog' or 'validate'.")
@@ -0,0 +1,135 @@
+import json
+import os
+import struct
+import threading
+
+# Every entry: meta length, body length (uint32), meta JSON, body
+ENTRY_HEADER = struct.Struct("<II")
+
+class Spool:
+    """
+    Append-only file of request bodies that could not be sent yet.
+
+    Entries are read back in the order they were written. An entry
+    stays on the spool until done() reports it delivered or spooled
+    again; the position of the oldest entry not done yet is kept in a
+    small side file next to the spool, so a later run picks up where
+    this one stopped. Entries done out of order may be sent again after
+    a crash, but none are lost. Once every entry is done, the spool file
+    is truncated.
+
+    Authorization headers are never written to disk; the sender adds
+    them back when the entry is sent.
+
+    Args:
+        path (str): Path of the spool file.
+    """
+
+    def __init__(self, path):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.path = path
+        self.offset_path = f"{path}.offset"
+        self.lock = threading.Lock()
+
+        self.writer = open(path, 'ab')
+        self.reader = open(path, 'rb')
+        self.size = self.writer.tell()
+        self.offset = 0
+
+        if os.path.exists(self.offset_path):
+            with open(self.offset_path, 'r') as f:
+                self.offset = min(int(f.read().strip() or 0), self.size)
+
+        # Where the next entry is read, and (start, end) of entries read but not done, oldest first
+        self.read_offset = self.offset
+        self.in_flight = {}
+
+        self.pending_events = self._count_pending()
+
+    def _count_pending(self):
+        events = 0
+        self.reader.seek(self.offset)
+        while True:
+            header = self.reader.read(ENTRY_HEADER.size)
+            if len(header) < ENTRY_HEADER.size:
+                break
+            meta_length, body_length = ENTRY_HEADER.unpack(header)
+            events += json.loads(self.reader.read(meta_length))["count"]
+            self.reader.seek(body_length, os.SEEK_CUR)
+        return events
+
+    def __len__(self):
+        return self.pending_events
+
+    def append(self, url, headers, body, count):
+        headers = {key: value for key, value in headers.items() if key.lower() != 'authorization'}
+        meta = json.dumps({"url": url, "headers": headers, "count": count}).encode('utf-8')
+
+        with self.lock:
+            self.writer.write(ENTRY_HEADER.pack(len(meta), len(body)))
+            self.writer.write(meta)
+            self.writer.write(body)
+            self.writer.flush()
+            self.size += ENTRY_HEADER.size + len(meta) + len(body)
+            self.pending_events += count
+
+    def pop(self):
+        """
+        Read the oldest entry that has not been read yet. It stays on
+        the spool until done() is called with its position.
+
+        Returns:
+            tuple: (url, headers, body, count, position), or None when
+            there is nothing left to read.
+        """
+        with self.lock:
+            if self.read_offset >= self.size:
+                return None
+
+            position = self.read_offset
+            self.reader.seek(position)
+            meta_length, body_length = ENTRY_HEADER.unpack(self.reader.read(ENTRY_HEADER.size))
+            meta = json.loads(self.reader.read(meta_length))
+            body = self.reader.read(body_length)
+
+            self.read_offset += ENTRY_HEADER.size + meta_length + body_length
+            self.in_flight[position] = self.read_offset
+            self.pending_events -= meta["count"]
+
+            return meta["url"], meta["headers"], body, meta["count"], position
+
+    def done(self, position):
+        """
+        Drop an entry read by pop() once it has been delivered, or
+        appended to the spool again.
+
+        Args:
+            position (int): The position pop() returned with the entry.
+        """
+        with self.lock:
+            del self.in_flight[position]
+            # Everything before the oldest entry still in flight is done
+            self.offset = next(iter(self.in_flight), self.read_offset)
+
+            if not self.in_flight and self.offset >= self.size:
+                # Everything has been sent, start over with an empty file
+                self.writer.truncate(0)
+                self.size = 0
+                self.offset = 0
+                self.read_offset = 0
+
+            self._save_offset()
+
+    def _save_offset(self):
+        temp_path = f"{self.offset_path}.tmp"
+        with open(temp_path, 'w') as f:
+            f.write(str(self.offset))
+        os.replace(temp_path, self.offset_path)
+
+    def close(self):
+        with self.lock:
+            self.writer.close()
+            self.reader.close()
@@ -0,0 +1,200 @@
+import re
+import synth
+
+# Slot values drawn per generator at a time
+STATEMENT_CHUNK = 1024
+
+# Quoted strings, with '' for an embedded quote, and numbers that are not part of a name
+LITERAL = re.compile(r"'(?:[^']|'')*'|(?<![\w.])\d+(?:\.\d+)?(?![\w.])")
+
+# e.g. "WHERE ORDER_ID = " in front of a literal
+COMPARED_COLUMN = re.compile(r"(\w+)\s*(?:=|<>|!=|<=|>=|<|>)\s*$")
+
+# e.g. INSERT INTO HR.EMPLOYEES (EMPLOYEE_ID, NAME) VALUES (
+INSERT_COLUMNS = re.compile(r"INSERT\s+INTO\s+[\w.$#\"]+\s*\(([^)]*)\)\s*VALUES\s*\(", re.IGNORECASE)
+
+class Digits:
+    # Numbers with as many digits and decimals as the literal they replace
+    ascii = True
+
+    def __init__(self, digits, decimals=0):
+        self.low = 10 ** (digits - 1) if digits > 1 else 0
+        self.span = 10 ** digits - self.low
+        self.decimals = decimals
+
+    def draw(self, count, rng):
+        low, span = self.low, self.span
+        uniform = rng.random
+        numbers = [str(low + int(uniform() * span)) for _ in range(count)]
+        if self.decimals:
+            scale = 10 ** self.decimals
+            numbers = [f"{number}.{int(uniform() * scale):0{self.decimals}d}" for number in numbers]
+        return numbers
+
+class SlotValues:
+    """
+    Values of one generator, drawn STATEMENT_CHUNK at a time and handed
+    out one by one, so a slot costs a list pop per event.
+
+    Args:
+        distribution (object): Draws escaped values with draw(count, rng).
+        rng (random.Random): Source of randomness.
+    """
+
+    def __init__(self, distribution, rng):
+        self.distribution = distribution
+        self.rng = rng
+        self.values = []
+
+    def take(self):
+        if not self.values:
+            self.values = self.distribution.draw(STATEMENT_CHUNK, self.rng)
+            self.values.reverse()
+        return self.values.pop()
+
+class StatementTemplate:
+    """
+    A SQL statement with its literals taken out, escaped once for the
+    output format. Rendering fills the slots with one str.format call.
+
+    Args:
+        pieces (list): Escaped text around the slots, one more than slots.
+        slots (list): SlotValues per literal, in statement order.
+    """
+
+    def __init__(self, pieces, slots):
+        self.slots = slots
+        self.format = "".join(piece.replace("{", "{{").replace("}", "}}") + ("{}" if index < len(slots) else "")
+                              for index, piece in enumerate(pieces))
+        self.constant = pieces[0] if not slots else None
+
+    def render(self):
+        if self.constant is not None:
+            return self.constant
+        return self.format.format(*[slot.take() for slot in self.slots])
+
+def split_statement(sql):
+    """
+    Take the numeric and quoted literals out of a SQL statement.
+
+    Returns:
+        tuple: The text around the literals, one piece more than there
+        are literals, and (literal, column) per literal, where column is
+        the name the literal is compared with or inserted into, if any.
+    """
+    columns = []
+    insert = INSERT_COLUMNS.search(sql)
+    if insert is not None:
+        columns = [column.strip().strip('"').upper() for column in insert.group(1).split(",")]
+
+    pieces = []
+    literals = []
+    values = 0
+    position = 0
+    for match in LITERAL.finditer(sql):
+        pieces.append(sql[position:match.start()])
+
+        column = None
+        compared = COMPARED_COLUMN.search(sql, 0, match.start())
+        if compared is not None:
+            column = compared.group(1).upper()
+        elif insert is not None and match.start() >= insert.end():
+            # The n-th value of the VALUES list goes into the n-th column
+            if values < len(columns):
+                column = columns[values]
+            values += 1
+
+        literals.append((match.group(), column))
+        position = match.end()
+    pieces.append(sql[position:])
+
+    return pieces, literals
+
+class StatementEngine:
+    """
+    Turns the SQL statement of every sample into a template whose
+    numeric and quoted literals are filled with fresh values per event.
+
+    Literals draw from, in order of preference: the distribution of the
+    column they belong to ("columns"), the "numbers" or "strings"
+    distribution, or by default numbers with the same number of digits
+    and the quoted strings found in all samples. Distributions are the
+    ones of synthesized fields. Values are drawn in chunks and escaped
+    once, so rendering a statement is a few list pops and one format.
+
+    Args:
+        samples (list): Parsed sample records, in template order.
+        escape (callable): Escapes a value for the output format.
+        config (dict): The "statements" section of the config.
+        rng (random.Random): Source of randomness.
+    """
+
+    def __init__(self, samples, escape, config, rng):
+        self.field = config.get("field", "sql_text")
+        self.rng = rng
+        columns = {name.upper(): spec for name, spec in config.get("columns", {}).items()}
+
+        split = [split_statement(sample.get(self.field) or "") for sample in samples]
+
+        # Quoted literals of the samples, without their quotes, for the default string slots
+        strings = sorted({literal[1:-1] for _, literals in split for literal, _ in literals
+                          if literal.startswith("'")})
+
+        self.generators = {}
+        self.templates = []
+        for pieces, literals in split:
+            slots = []
+            escaped = [escape(piece) for piece in pieces]
+            for index, (literal, column) in enumerate(literals):
+                quoted = literal.startswith("'")
+                if quoted:
+                    # Quotes stay in the text around the slot
+                    escaped[index] += escape("'")
+                    escaped[index + 1] = escape("'") + escaped[index + 1]
+
+                if column in columns:
+                    key, spec = ("column", column), columns[column]
+                elif quoted:
+                    key, spec = ("strings",), config.get("strings", {"type": "categorical", "values": strings})
+                elif "numbers" in config:
+                    key, spec = ("numbers",), config["numbers"]
+                else:
+                    whole, _, fraction = literal.partition(".")
+                    key, spec = ("digits", len(whole), len(fraction)), None
+
+                slots.append(self._generator(key, spec, escape))
+            self.templates.append(StatementTemplate(escaped, slots))
+
+        # With ASCII values only, a statement's length is its size in bytes
+        self.ascii = (all(template.format.isascii() for template in self.templates)
+                      and all(slots.distribution.ascii for slots in self.generators.values()))
+
+    def _generator(self, key, spec, escape):
+        if key not in self.generators:
+            if key[0] == "digits":
+                distribution = Digits(key[1], key[2])
+            else:
+                kind = spec.get("type", "categorical")
+                if kind not in synth.DISTRIBUTIONS:
+                    raise ValueError(f"Invalid distribution '{kind}' for statements. "
+                                     f"Use one of: {', '.join(synth.DISTRIBUTIONS)}.")
+                distribution = synth.DISTRIBUTIONS[kind](spec, escape)
+            self.generators[key] = SlotValues(distribution, self.rng)
+        return self.generators[key]
+
+    def render(self, index):
+        # The statement of template `index` with fresh literals, escaped
+        return self.templates[index].render()
+
+    def average_size(self, value_size, count=64):
+        # Average size of a rendered statement, by rendering a few of each
+        sizes = [value_size(template.render()) for template in self.templates for _ in range(count)]
+        return sum(sizes) / len(sizes) if sizes else 0.0
+
+    def state(self):
+        # Values drawn but not handed out yet, for checkpoints
+        return [slots.values for slots in self.generators.values()]
+
+    def restore(self, state):
+        for slots, values in zip(self.generators.values(), state):
+            slots.values = list(values)
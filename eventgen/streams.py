@@ -0,0 +1,346 @@
+import heapq
+import json
+import os
+import random
+import time
+import eventgen
+import profiles
+import sinks
+import synth
+import templates
+import xml_handler
+from metrics import Metrics
+from sender import Sender
+
+# Synthesized rows kept per stream, smaller than SYNTH_CHUNK to keep streams light
+STREAM_SYNTH_CHUNK = 256
+
+# Points in a stream's load profile table, coarser than a single run's to keep streams light
+STREAM_PROFILE_RESOLUTION = 3600
+
+# Settings that only make sense for a whole process, not per stream
+UNSUPPORTED = ("backfill", "budget", "sessions", "statements", "checkpoint", "resume")
+
+def stream_configs(config):
+    """
+    Expand the "streams" list of the config into one full configuration
+    per stream. Every stream inherits the top-level settings and
+    overrides what it declares itself. Streams that inherit a file sink
+    write to a file of their own, named after the stream.
+
+    Returns:
+        list: One configuration per stream, each with a "name".
+    """
+    base = {key: value for key, value in config.items() if key != "streams"}
+
+    configs = []
+    # Streams by the absolute path of their file sink
+    paths = {}
+    for index, stream in enumerate(config["streams"]):
+        stream_config = dict(base, **stream)
+        stream_config.setdefault("name", f"stream-{index}")
+        for key in UNSUPPORTED:
+            if stream_config.get(key):
+                raise ValueError(f"Invalid stream '{stream_config['name']}'. "
+                                 f"'{key}' is not supported with streams.")
+
+        sink = stream_config.get("sink", {})
+        if sink.get("type") == "file":
+            if "sink" not in stream and len(config["streams"]) > 1:
+                root, ext = os.path.splitext(sink["path"])
+                stream_config["sink"] = sink = dict(sink, path=f"{root}-{stream_config['name']}{ext}")
+
+            # Writers of one file would interleave, gzip members and rotations included
+            path = os.path.abspath(sink["path"])
+            if path in paths:
+                raise ValueError(f"Invalid stream '{stream_config['name']}'. "
+                                 f"Its file sink writes to {sink['path']}, like stream '{paths[path]}'.")
+            paths[path] = stream_config["name"]
+
+        configs.append(stream_config)
+
+    return configs
+
+class Stream:
+    """
+    State of one event stream: its templates, timestamp source, batch,
+    sink and position in the schedule.
+
+    Compiled templates are shared between streams that replay the same
+    samples in the same format, and load profiles between streams with
+    the same profile and no bursts, so a stream costs a few kilobytes on
+    top of its batch.
+
+    Args:
+        config (dict): Full configuration of the stream.
+        compiled (dict): Templates already compiled, by sample settings.
+        timestamps (dict): Timestamp sources already created, by timezone.
+        loaded_profiles (dict): Load profiles already built, by profile settings.
+        sink (object): Where the stream's events go.
+        unit (str): What the schedule counts, "bytes" or "events".
+        rng (random.Random): Source of randomness, shared by all streams of the run.
+    """
+
+    def __init__(self, config, compiled, timestamps, loaded_profiles, sink, unit, rng):
+        self.name = config["name"]
+        self.sink = sink
+        self.rng = rng
+
+        self.synthesizer = None
+        fields = ("timestamp",)
+        if config.get("fields"):
+            escape = templates.escape_json if config["format"] == "json" else templates.escape_xml
+            self.synthesizer = synth.Synthesizer(config["fields"], escape, rng)
+            fields += self.synthesizer.fields
+        self.rows = []
+        self.value_size = len
+        if self.synthesizer is not None and not self.synthesizer.ascii:
+            self.value_size = lambda value: len(value.encode('utf-8'))
+
+        key = (config["samples"], config.get("sample_format", "auto"), config["format"], fields,
+               config.get("sample_limit"))
+        if key not in compiled:
+            event_templates = templates.compile_templates(eventgen.load_samples(config, rng), config["format"], fields)
+            compiled[key] = (event_templates, [template.size for template in event_templates])
+        self.templates, self.charges = compiled[key]
+        self.content_type = eventgen.CONTENT_TYPES[config["format"]]
+
+        timezone = config.get("timezone", xml_handler.DEFAULT_TIMEZONE)
+        if timezone not in timestamps:
+            timestamps[timezone] = xml_handler.TimestampSource(timezone)
+        self.timestamps = timestamps[timezone]
+
+        self.batch = eventgen.EventBatch(**config["batch"]) if config.get("batch") else None
+        self.terminated = config.get("sink", {}).get("type", "http") != "http"
+
+        self.byte_limit = eventgen.parse_size(config["output_size"])
+        duration = eventgen.parse_time_range(config["time_range"])
+
+        self.unit = unit
+        if unit == "bytes":
+            self.total = self.byte_limit
+        else:
+            sample_timestamp = self.timestamps.format(int(time.time() * 1000000))
+            average = sum(self.charges) / len(self.charges) + len(sample_timestamp)
+            self.total = self.byte_limit // (average + (1 if self.terminated or self.batch else 0))
+
+        # Bursts are drawn per stream, so only profiles without them are the same for every stream
+        profile_key = None
+        if config.get("profile") and not config["profile"].get("bursts"):
+            profile_key = (json.dumps(config["profile"], sort_keys=True), timezone, duration)
+        if profile_key is not None and profile_key in loaded_profiles:
+            self.profile = loaded_profiles[profile_key]
+        else:
+            self.profile = profiles.create_profile(config, duration, rng=rng, resolution=STREAM_PROFILE_RESOLUTION)
+            if profile_key is not None:
+                loaded_profiles[profile_key] = self.profile
+        self.rate = self.total / duration
+
+        # Start of the stream's schedule on the monotonic clock
+        self.start = 0.0
+        self.consumed = 0
+        self.events = 0
+        self.bytes = 0
+
+    def due(self):
+        # Monotonic time at which the stream's next event is due
+        if self.profile is None:
+            return self.start + self.consumed / self.rate if self.rate > 0 else self.start
+        return self.start + self.profile.inverse(self.consumed / self.total if self.total > 0 else 1.0)
+
+    def done(self):
+        return self.bytes >= self.byte_limit
+
+    def emit(self):
+        index = self.rng.randrange(len(self.templates))
+        timestamp = self.timestamps.now()
+
+        if self.synthesizer is None:
+            event = self.templates[index].render((timestamp,))
+            event_size = self.charges[index] + len(timestamp)
+        else:
+            if not self.rows:
+                self.rows = self.synthesizer.rows(STREAM_SYNTH_CHUNK)
+                self.rows.reverse()
+            row = self.rows.pop()
+            event = self.templates[index].render((timestamp,) + row)
+            event_size = self.charges[index] + len(timestamp) + sum(self.value_size(value) for value in row)
+
+        separator = 1 if self.terminated or (self.batch is not None and self.batch.events) else 0
+
+        if self.batch is None:
+            eventgen.dispatch_event(event, self.sink, self.content_type)
+        else:
+            self.batch.add(event, event_size, self.content_type)
+            if self.batch.should_flush():
+                eventgen.dispatch_batch(self.batch, self.sink)
+
+        self.events += 1
+        self.bytes += event_size + separator
+        self.consumed += event_size + separator if self.unit == "bytes" else 1
+
+    def flush_due(self, deadline):
+        # Send the batch out if it is still the one that was due at `deadline`
+        if self.batch is not None and self.batch.deadline() == deadline:
+            eventgen.dispatch_batch(self.batch, self.sink)
+
+    def close(self):
+        if self.batch is not None and self.batch.events:
+            eventgen.dispatch_batch(self.batch, self.sink)
+        self.sink.close()
+
+def run_streams(config, progress=eventgen.print_progress):
+    """
+    Generate all streams of the config in this process.
+
+    A single scheduler keeps the streams in a heap ordered by the time
+    their next event is due, so pacing costs O(log n) per event however
+    many streams there are. HTTP streams share one sender, and with it
+    its threads and keep-alive connections, even when their webhook URLs
+    differ. The "sender", "scheduler" and "metrics" sections of the top
+    level apply to the whole process.
+
+    Args:
+        config (dict): Configuration with a "streams" list.
+        progress (callable): Called with the running totals once a minute.
+
+    Returns:
+        dict: Combined statistics, like generate_events, with one entry
+        per stream under "streams".
+    """
+    # Every random choice of every stream comes from one generator, so a seed reproduces the run
+    rng = random.Random(config.get("seed"))
+
+    scheduler_config = config.get("scheduler", {})
+    unit = scheduler_config.get("unit", "bytes")
+    if unit not in ("bytes", "events"):
+        raise ValueError("Invalid scheduler unit. Use 'events' or 'bytes'.")
+    burst = scheduler_config.get("burst", 1.0)
+    min_sleep = scheduler_config.get("min_sleep", 0.002)
+
+    metrics = Metrics(**config["metrics"]) if config.get("metrics") else None
+    configs = stream_configs(config)
+
+    sender = None
+    if any(stream.get("sink", {}).get("type", "http") == "http" for stream in configs):
+        sender = Sender(**config.get("sender", {}), metrics=metrics)
+
+    compiled = {}
+    timestamps = {}
+    loaded_profiles = {}
+    streams = [Stream(stream, compiled, timestamps, loaded_profiles, sinks.create_sink(stream, metrics, sender),
+                      unit, rng)
+               for stream in configs]
+
+    # All schedules start together, once every stream is set up
+    start = time.monotonic()
+    for stream in streams:
+        stream.start = start
+
+    if metrics is not None:
+        stream_events = metrics.counter("eventgen_stream_events_total", "Events generated per stream.",
+                                        label="stream")
+        stream_bytes = metrics.counter("eventgen_stream_bytes_total", "Logical bytes generated per stream.",
+                                       label="stream")
+
+    # (due time, stream index), the earliest due stream on top
+    heap = [(stream.due(), index) for index, stream in enumerate(streams) if not stream.done()]
+    heapq.heapify(heap)
+    # (max_age deadline, stream index) of the batches waiting to go out, sent while sleeping
+    deadlines = []
+
+    start_time = time.time()
+    last_print_time = start_time
+    last_metrics_time = start_time
+    event_count = 0
+    total_bytes = 0
+
+    while heap:
+        due, index = heap[0]
+        stream = streams[index]
+
+        now = time.monotonic()
+        wait = due - now
+        if wait >= min_sleep:
+            # Batches that reach max_age before the next event go out on time
+            while deadlines and deadlines[0][0] < due:
+                deadline, batch_index = heapq.heappop(deadlines)
+                time.sleep(max(0.0, deadline - time.monotonic()))
+                streams[batch_index].flush_due(deadline)
+            time.sleep(max(0.0, due - time.monotonic()))
+        else:
+            while deadlines and deadlines[0][0] <= now:
+                deadline, batch_index = heapq.heappop(deadlines)
+                streams[batch_index].flush_due(deadline)
+            if -wait > burst:
+                # Too far behind, give up on the time that cannot be caught up
+                stream.start += -wait - burst
+
+        before = stream.bytes
+        stream.emit()
+        event_count += 1
+        total_bytes += stream.bytes - before
+        if stream.batch is not None and len(stream.batch.events) == 1:
+            heapq.heappush(deadlines, (stream.batch.deadline(), index))
+
+        if stream.done():
+            heapq.heappop(heap)
+        else:
+            heapq.heapreplace(heap, (stream.due(), index))
+
+        current_time = time.time()
+
+        if metrics is not None and current_time - last_metrics_time >= 1:
+            last_metrics_time = current_time
+            metrics.events.set_total(event_count)
+            metrics.bytes.set_total(total_bytes)
+            for each in streams:
+                stream_events.set_total(each.events, each.name)
+                stream_bytes.set_total(each.bytes, each.name)
+
+        if current_time - last_print_time >= 60:
+            last_print_time = current_time
+            progress(event_count, total_bytes, (current_time - start_time) // 60)
+
+    progress(event_count, total_bytes, (time.time() - start_time) // 60)
+
+    for stream in streams:
+        stream.close()
+    if sender is not None:
+        sender.close()
+
+    elapsed = time.monotonic() - start
+    consumed = sum(stream.consumed for stream in streams)
+    actual = consumed / elapsed if elapsed > 0 else 0.0
+    target = sum(stream.rate for stream in streams)
+    drift = {"elapsed": elapsed, "actual_rate": actual, "target_rate": target,
+             "drift_pct": (actual - target) / target * 100 if target > 0 else 0.0}
+
+    # Shared senders are counted once, other sinks each have their own stats
+    senders = list(sender.stats) if sender is not None else []
+    for stream in streams:
+        if not getattr(stream.sink, "shared", False):
+            senders.extend(stream.sink.stats)
+
+    profile = None
+    if metrics is not None:
+        metrics.events.set_total(event_count)
+        metrics.bytes.set_total(total_bytes)
+        for stream in streams:
+            stream_events.set_total(stream.events, stream.name)
+            stream_bytes.set_total(stream.bytes, stream.name)
+        profile = metrics.close().get("profile")
+
+    return {
+        "events": event_count,
+        "bytes": total_bytes,
+        "unit": unit,
+        "drift": drift,
+        "body_bytes": sum(stats["bytes"] for stats in senders),
+        "wire_bytes": sum(stats["wire_bytes"] for stats in senders),
+        "spooled": sender.spooled() if sender is not None else 0,
+        "label": "Sender" if all(getattr(stream.sink, "shared", False) for stream in streams) else "Sink",
+        "senders": senders,
+        "profile": profile,
+        "streams": [{"name": stream.name, "events": stream.events, "bytes": stream.bytes} for stream in streams]
+    }
@@ -0,0 +1,136 @@
+import random
+
+class AliasTable:
+    """
+    Weighted categorical distribution drawn with Vose's alias method.
+
+    Building the table is O(n), every draw after that is O(1) no
+    matter how many categories there are.
+
+    Args:
+        values (list): The categories.
+        weights (list): One non-negative weight per category.
+    """
+
+    def __init__(self, values, weights):
+        if not values or len(values) != len(weights):
+            raise ValueError("An alias table needs one weight per value.")
+
+        total = float(sum(weights))
+        if total <= 0:
+            raise ValueError("An alias table needs at least one positive weight.")
+
+        count = len(values)
+        scaled = [weight * count / total for weight in weights]
+        self.values = list(values)
+        self.prob = [1.0] * count
+        self.alias = list(range(count))
+
+        small = [index for index, weight in enumerate(scaled) if weight < 1.0]
+        large = [index for index, weight in enumerate(scaled) if weight >= 1.0]
+
+        while small and large:
+            less, more = small.pop(), large.pop()
+            self.prob[less] = scaled[less]
+            self.alias[less] = more
+            scaled[more] -= 1.0 - scaled[less]
+            if scaled[more] < 1.0:
+                small.append(more)
+            else:
+                large.append(more)
+
+    def draw(self, count, rng=random):
+        values, prob, alias = self.values, self.prob, self.alias
+        size = len(values)
+        draws = []
+
+        for _ in range(count):
+            pick = rng.random() * size
+            index = int(pick)
+            draws.append(values[index] if pick - index < prob[index] else values[alias[index]])
+
+        return draws
+
+class Categorical:
+    # "values" is either a list of equally likely values or a value -> weight mapping
+    def __init__(self, spec, escape):
+        values = spec["values"]
+        if isinstance(values, dict):
+            weights = list(values.values())
+            values = list(values)
+        else:
+            weights = [1] * len(values)
+
+        self.table = AliasTable([escape(str(value)) for value in values], weights)
+        self.ascii = all(value.isascii() for value in self.table.values)
+
+    def draw(self, count, rng):
+        return self.table.draw(count, rng)
+
+class Zipf:
+    # "values" are ranked from most to least frequent, "s" is the skew exponent
+    def __init__(self, spec, escape):
+        values = spec["values"]
+        skew = spec.get("s", 1.0)
+        weights = [1.0 / rank ** skew for rank in range(1, len(values) + 1)]
+
+        self.table = AliasTable([escape(str(value)) for value in values], weights)
+        self.ascii = all(value.isascii() for value in self.table.values)
+
+    def draw(self, count, rng):
+        return self.table.draw(count, rng)
+
+class IntegerRange:
+    # Uniform integers between "min" and "max", both included
+    ascii = True
+
+    def __init__(self, spec, escape):
+        self.low = spec["min"]
+        self.high = spec["max"]
+
+    def draw(self, count, rng):
+        low, high = self.low, self.high
+        return [str(rng.randint(low, high)) for _ in range(count)]
+
+DISTRIBUTIONS = {
+    "categorical": Categorical,
+    "zipf": Zipf,
+    "range": IntegerRange
+}
+
+class Synthesizer:
+    """
+    Fills columns of field values for many events per call.
+
+    Every field declared in the config is drawn from its distribution.
+    Values are escaped for the output format when the distribution is
+    built, so generated columns can go straight into template slots.
+
+    Args:
+        fields (dict): Field name -> distribution spec, e.g.
+            {"userid": {"type": "zipf", "values": ["JDOE", "SALLY"], "s": 1.2}}.
+        escape (callable): Escapes a value for the output format.
+        rng (random.Random): Source of randomness.
+    """
+
+    def __init__(self, fields, escape, rng=random):
+        self.fields = tuple(fields)
+        self.rng = rng
+        self.distributions = []
+
+        for name, spec in fields.items():
+            kind = spec.get("type", "categorical")
+            if kind not in DISTRIBUTIONS:
+                raise ValueError(f"Invalid distribution '{kind}' for field '{name}'. "
+                                 f"Use one of: {', '.join(DISTRIBUTIONS)}.")
+            self.distributions.append(DISTRIBUTIONS[kind](spec, escape))
+
+        # With ASCII values only, a value's length is its size in bytes
+        self.ascii = all(distribution.ascii for distribution in self.distributions)
+
+    def columns(self, count):
+        return [distribution.draw(count, self.rng) for distribution in self.distributions]
+
+    def rows(self, count):
+        # One tuple of field values per event
+        return list(zip(*self.columns(count)))
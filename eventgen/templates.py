@@ -0,0 +1,118 @@
+import json
+import re
+import xml.etree.ElementTree as ET
+import xml.sax.saxutils as saxutils
+import xml_handler
+
+# Marker put in place of a dynamic field while the template is compiled.
+# It only uses characters that JSON and XML serialization leave untouched.
+SLOT_MARKER = "@@EVENTGEN_SLOT_{}@@"
+SLOT_PATTERN = re.compile(r"@@EVENTGEN_SLOT_(\d+)@@")
+
+# Version of the compiled form, cached templates of another version are compiled again
+TEMPLATE_VERSION = 2
+
+def serialize_record(record, output_format):
+    """
+    Serialize a record exactly the way events are sent on the wire.
+
+    Args:
+        record (dict): The parsed audit record.
+        output_format (str): Either "json" or "xml".
+
+    Returns:
+        str: The serialized event.
+    """
+    if output_format == "json":
+        return json.dumps(record)
+    elif output_format == "xml":
+        return ET.tostring(xml_handler.json_to_xml(record), encoding='utf-8', method='xml').decode('utf-8')
+    else:
+        raise ValueError("Invalid format. Use 'json' or 'xml'.")
+
+def escape_json(value):
+    # Same escaping json.dumps applies to a string value
+    return json.dumps(value)[1:-1]
+
+def escape_xml(value):
+    # sanitize_value escapes the value once, then ElementTree escapes it again
+    return saxutils.escape(xml_handler.sanitize_value(value))
+
+class EventTemplate:
+    """
+    A sample record serialized once, with slots for its dynamic fields.
+
+    Key normalization and value escaping of the static fields happen at
+    compile time. Rendering an event is a single str.format of the
+    already escaped slot values, and produces exactly the bytes the
+    json.dumps / json_to_xml path would.
+
+    Args:
+        sample (dict): The parsed audit record.
+        output_format (str): Either "json" or "xml".
+        fields (tuple): Names of the fields filled in per event.
+    """
+
+    # A corpus can compile to hundreds of thousands of templates
+    __slots__ = ("fields", "output_format", "escape", "format", "size")
+
+    def __init__(self, sample, output_format, fields=("timestamp",)):
+        record = dict(sample)
+        for index, field in enumerate(fields):
+            record[field] = SLOT_MARKER.format(index)
+
+        text = serialize_record(record, output_format)
+
+        # Slots may come out in any order, so keep the field index of each
+        parts = SLOT_PATTERN.split(text)
+        pieces = parts[0::2]
+        slots = [int(index) for index in parts[1::2]]
+        if sorted(slots) != list(range(len(fields))):
+            raise ValueError(f"Could not compile template slots for fields {', '.join(fields)}.")
+
+        self.fields = tuple(fields)
+        self.output_format = output_format
+        self.escape = escape_json if output_format == "json" else escape_xml
+
+        format_parts = []
+        for index, piece in enumerate(pieces):
+            format_parts.append(piece.replace("{", "{{").replace("}", "}}"))
+            if index < len(slots):
+                format_parts.append(f"{{{slots[index]}}}")
+        self.format = "".join(format_parts)
+
+        # Bytes of the static part, slot values are added per event
+        self.size = sum(len(piece.encode('utf-8')) for piece in pieces)
+
+    @classmethod
+    def from_compiled(cls, format_string, size, output_format, fields):
+        """
+        Rebuild a template from its compiled format string and static
+        size, e.g. as kept in the sample cache, without serializing the
+        record again.
+        """
+        template = cls.__new__(cls)
+        template.fields = tuple(fields)
+        template.output_format = output_format
+        template.escape = escape_json if output_format == "json" else escape_xml
+        template.format = format_string
+        template.size = size
+        return template
+
+    def render(self, values):
+        """
+        Render an event from already escaped slot values.
+
+        Args:
+            values (tuple): One escaped string per field, in field order.
+
+        Returns:
+            str: The serialized event.
+        """
+        return self.format.format(*values)
+
+def compile_templates(samples, output_format, fields=("timestamp",)):
+    # Samples from the sample cache bring their templates, compiled once per format and fields
+    if hasattr(samples, "templates"):
+        return samples.templates(output_format, fields)
+    return [EventTemplate(sample, output_format, fields) for sample in samples]
@@ -0,0 +1,198 @@
+import multiprocessing
+import os
+import queue
+import random
+import time
+import eventgen
+import streams
+
+# Session ids each worker may hand out, so the workers' sessions never share an id
+SESSION_ID_STRIDE = 10**8
+
+def shard_config(config, count):
+    """
+    Split one run into `count` worker configurations.
+
+    Every worker covers the whole time range with its share of the byte
+    budget, so together they keep the configured rate. Each worker gets
+    its own seed. With a "streams" list, the streams are dealt out to
+    the workers instead, each keeping its own budget.
+
+    Args:
+        config (dict): Configuration settings for the whole run.
+        count (int): Number of worker processes.
+
+    Returns:
+        list: One configuration per worker.
+    """
+    streams = config.get("streams")
+
+    # Writes of several processes to one stdout can interleave in the middle of an event
+    sink_types = [stream.get("sink", config.get("sink", {})).get("type") for stream in streams or [config]]
+    if "stdout" in sink_types:
+        raise ValueError("Invalid sink for --workers. Use a 'file' sink, workers cannot share stdout.")
+
+    if streams:
+        count = min(count, len(streams))
+    else:
+        byte_limit = eventgen.parse_size(config["output_size"])
+    base_seed = config.get("seed", random.randrange(2**32))
+
+    shards = []
+    for index in range(count):
+        shard = dict(config)
+        shard["seed"] = base_seed + index
+
+        if streams:
+            shard["streams"] = streams[index::count]
+        else:
+            share = byte_limit // count
+            # Hand the remainder to the first workers, one byte each
+            if index < byte_limit % count:
+                share += 1
+            shard["output_size"] = f"{share}B"
+
+        # Each worker simulates its share of the sessions, in its own range of session ids
+        if config.get("sessions"):
+            sessions = config["sessions"]
+            concurrent = sessions.get("count", 10000)
+            shard["sessions"] = dict(sessions, count=max(1, concurrent // count + (index < concurrent % count)),
+                                     first_id=sessions.get("first_id", 1) + index * SESSION_ID_STRIDE)
+
+        # Workers share one load profile, bursts included
+        if config.get("profile") and "seed" not in config["profile"]:
+            shard["profile"] = dict(config["profile"], seed=base_seed)
+
+        # Workers must not share an output, checkpoint or spool file
+        sink = config.get("sink", {})
+        if sink.get("type") == "file":
+            base, ext = os.path.splitext(sink["path"])
+            shard["sink"] = dict(sink, path=f"{base}-w{index}{ext}")
+        elif sink.get("type") == "validate" and sink.get("report"):
+            base, ext = os.path.splitext(sink["report"])
+            shard["sink"] = dict(sink, report=f"{base}-w{index}{ext}")
+
+        if config.get("checkpoint"):
+            base, ext = os.path.splitext(config["checkpoint"]["path"])
+            shard["checkpoint"] = dict(config["checkpoint"], path=f"{base}-w{index}{ext}")
+
+        sender = config.get("sender", {})
+        if sender.get("spool"):
+            base, ext = os.path.splitext(sender["spool"])
+            shard["sender"] = dict(sender, spool=f"{base}-w{index}{ext}")
+
+        # Nor a metrics file or endpoint port
+        metrics = config.get("metrics", {})
+        if metrics.get("path"):
+            base, ext = os.path.splitext(metrics["path"])
+            shard["metrics"] = metrics = dict(metrics, path=f"{base}-w{index}{ext}")
+        if metrics.get("port") is not None:
+            shard["metrics"] = dict(metrics, port=metrics["port"] + index)
+
+        shards.append(shard)
+
+    return shards
+
+def _run_worker(index, config, results):
+    def progress(event_count, total_bytes, elapsed_minutes):
+        results.put(("progress", index, event_count, total_bytes))
+
+    if config.get("streams"):
+        stats = streams.run_streams(config, progress=progress)
+    else:
+        stats = eventgen.generate_events(config, progress=progress)
+    results.put(("done", index, stats))
+
+def run_workers(config, count):
+    """
+    Run the generator in `count` processes and report their combined
+    progress and summary.
+
+    Args:
+        config (dict): Configuration settings for the whole run.
+        count (int): Number of worker processes.
+    """
+    results = multiprocessing.Queue()
+    processes = []
+    shards = shard_config(config, count)
+    count = len(shards)
+
+    for index, shard in enumerate(shards):
+        process = multiprocessing.Process(target=_run_worker, args=(index, shard, results),
+                                          name=f"eventgen-{index}")
+        process.start()
+        processes.append(process)
+
+    stream = eventgen.status_stream(config)
+    progress = {index: (0, 0) for index in range(count)}
+    summaries = {}
+
+    start_time = time.time()
+    last_print_time = start_time
+
+    while len(summaries) < count:
+        try:
+            message = results.get(timeout=1)
+        except queue.Empty:
+            # A worker that died without reporting would stall the run
+            if not any(process.is_alive() for process in processes):
+                break
+            continue
+
+        if message[0] == "progress":
+            _, index, event_count, total_bytes = message
+            progress[index] = (event_count, total_bytes)
+        else:
+            _, index, stats = message
+            progress[index] = (stats["events"], stats["bytes"])
+            summaries[index] = stats
+
+        current_time = time.time()
+        if current_time - last_print_time >= 60:
+            last_print_time = current_time
+            eventgen.print_progress(sum(events for events, _ in progress.values()),
+                                    sum(total for _, total in progress.values()),
+                                    (current_time - start_time) // 60, file=stream)
+
+    for process in processes:
+        process.join()
+
+    eventgen.print_progress(sum(events for events, _ in progress.values()),
+                            sum(total for _, total in progress.values()),
+                            (time.time() - start_time) // 60, file=stream)
+
+    if len(summaries) < count:
+        print(f"{count - len(summaries)} worker(s) exited without a summary.", file=stream)
+
+    print_summary(summaries, file=stream)
+
+def print_summary(summaries, file=None):
+    for index in sorted(summaries):
+        stats = summaries[index]
+        drift = stats["drift"]
+        sent = sum(sender["events"] for sender in stats["senders"])
+        failed = sum(sender["failed_events"] for sender in stats["senders"])
+
+        print(f"Worker {index}: {stats['events']} events, {stats['bytes']} bytes, "
+              f"{sent} events sent, {failed} events failed, {stats['spooled']} events spooled, "
+              f"drift {drift['drift_pct']:+.2f}%.", file=file)
+
+        eventgen.print_streams(stats.get("streams", []), file=file)
+        if stats["profile"]:
+            eventgen.print_profile(stats["profile"], file=file)
+
+    if not summaries:
+        return
+
+    unit = next(iter(summaries.values()))["unit"]
+    elapsed = max(stats["drift"]["elapsed"] for stats in summaries.values())
+    target = sum(stats["drift"]["target_rate"] for stats in summaries.values())
+    consumed = sum(stats["bytes"] if unit == "bytes" else stats["events"] for stats in summaries.values())
+    actual = consumed / elapsed if elapsed > 0 else 0.0
+    drift = (actual - target) / target * 100 if target > 0 else 0.0
+
+    print(f"Throughput: {actual:.2f} {unit}/s (target {target:.2f} {unit}/s, drift {drift:+.2f}%).", file=file)
+
+    totals = {key: sum(stats[key] for stats in summaries.values()) for key in ("bytes", "body_bytes", "wire_bytes")}
+    print(f"Bytes: {totals['bytes']} logical, {totals['wire_bytes']} on the wire "
+          f"({eventgen.compression_ratio(totals):.2f}x compression).", file=file)
@@ -1,19 +1,82 @@
-import re, json, random
+import re, json, random, time, os, mmap
 import xml.etree.ElementTree as ET
 from xml.dom import minidom
 import xml.sax.saxutils as saxutils
 from datetime import datetime
 import pytz
 
-def get_current_timestamp():
-    # Get the current time with timezone info
-    tz = pytz.timezone('America/New_York')  # You can use your local timezone (e.g., 'Europe/Paris', 'America/New_York')
-    now = datetime.now(tz)
+DEFAULT_TIMEZONE = 'America/New_York'
 
-    # Format the timestamp in the desired format: YYYY-MM-DDTHH:MM:SS.ssssss+HH:MM
-    formatted_timestamp = now.isoformat()
+class TimestampSource:
+    """
+    Produces event timestamps in the YYYY-MM-DDTHH:MM:SS.ssssss+HH:MM
+    format of datetime.isoformat(), for a timezone resolved once.
+
+    The formatted date, time and UTC offset are cached per second, so
+    most calls only format the microseconds. Stamps handed out by one
+    source always increase, even when several are taken within the
+    same microsecond.
+
+    Args:
+        timezone_name (str): Name of the timezone, e.g. 'Europe/Paris'.
+        clock (callable): Returns the current time in seconds since the epoch.
+    """
+
+    def __init__(self, timezone_name=DEFAULT_TIMEZONE, clock=time.time):
+        self.tz = pytz.timezone(timezone_name)
+        self.clock = clock
+        self.second = None
+        self.prefix = ''
+        self.offset = ''
+        self.last = -1
+
+    def format(self, micros):
+        second, micro = divmod(micros, 1000000)
+
+        if second != self.second:
+            # e.g. 2024-09-12T12:11:27-04:00, the offset may change with DST
+            formatted = datetime.fromtimestamp(second, self.tz).isoformat()
+            self.prefix = formatted[:19]
+            self.offset = formatted[19:]
+            self.second = second
+
+        # isoformat() leaves out the fraction when it is zero
+        if micro:
+            return f"{self.prefix}.{micro:06d}{self.offset}"
+        return self.prefix + self.offset
+
+    def now(self):
+        micros = max(int(self.clock() * 1000000), self.last + 1)
+        self.last = micros
+
+        return self.format(micros)
+
+    def batch(self, count):
+        """
+        Timestamps for `count` events, one microsecond apart.
+
+        Args:
+            count (int): Number of timestamps.
+
+        Returns:
+            list: Monotonically increasing timestamps.
+        """
+        micros = max(int(self.clock() * 1000000), self.last + 1)
+        self.last = micros + count - 1
 
-    return formatted_timestamp
+        return [self.format(value) for value in range(micros, micros + count)]
+
+# One cached source per timezone for get_current_timestamp
+_timestamp_sources = {}
+
+def get_current_timestamp(timezone_name=DEFAULT_TIMEZONE):
+    # Get the current time with timezone info, resolving the timezone only once
+    source = _timestamp_sources.get(timezone_name)
+    if source is None:
+        source = _timestamp_sources[timezone_name] = TimestampSource(timezone_name)
+
+    # Format the timestamp in the desired format: YYYY-MM-DDTHH:MM:SS.ssssss+HH:MM
+    return source.now()
 
 # Define a function to parse a single record
 def parse_record(record_lines):
@@ -26,32 +89,62 @@ def parse_record(record_lines):
             record_dict[key] = value
     return record_dict
 
+# Bump when parsing changes, so cached samples get rebuilt
+PARSER_VERSION = 2
+
+# Every record starts on a line beginning with this marker
+RECORD_MARKER = b'TIMESTAMP: "'
+
+# Yield the (start, end) byte offsets of every record in a mapped file
+def _record_spans(mapped):
+    size = len(mapped)
+    boundary = b'\n' + RECORD_MARKER
+
+    start = 0
+    if mapped[:len(RECORD_MARKER)] != RECORD_MARKER:
+        # Lines before the first marker are kept as a record of their own
+        first = mapped.find(boundary)
+        start = size if first < 0 else first + 1
+        yield 0, start
+
+    while start < size:
+        found = mapped.find(boundary, start)
+        end = size if found < 0 else found + 1
+        yield start, end
+        start = end
+
+def _parse_span(mapped, start, end):
+    lines = [line.strip() for line in mapped[start:end].decode('utf-8').splitlines()]
+    return parse_record(lines)
+
+# Define a function to stream the records of a file one at a time
+def iter_audit_log(file_path):
+    """
+    Parse an audit log file lazily, one record at a time.
+
+    The file is memory-mapped and scanned for record markers, so memory
+    use does not grow with the size of the file.
+
+    Args:
+        file_path (str): Path to the audit log file.
+
+    Yields:
+        dict: One parsed record.
+    """
+    with open(file_path, 'rb') as f:
+        # Empty files cannot be mapped
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            for start, end in _record_spans(mapped):
+                record = _parse_span(mapped, start, end)
+                if record:
+                    yield record
+
 # Define a function to load the file and parse the records
 def parse_audit_log(file_path):
-    with open(file_path, 'r') as f:
-        lines = f.readlines()
-    
-    # Regex to identify timestamp as a delimiter for each record
-    timestamp_pattern = re.compile(r'^TIMESTAMP: ".*"')
-    
-    records = []
-    current_record_lines = []
-    
-    for line in lines:
-        if timestamp_pattern.match(line):
-            if current_record_lines:  # If we have collected lines for a record, parse it
-                record = parse_record(current_record_lines)
-                records.append(record)
-                current_record_lines = []
-        
-        current_record_lines.append(line.strip())
-    
-    # Don't forget the last record in the file
-    if current_record_lines:
-        record = parse_record(current_record_lines)
-        records.append(record)
-
-    return records
+    return list(iter_audit_log(file_path))
 
 # Function to convert a single JSON record to an XML element
 def json_record_to_xml(record):
@@ -81,10 +174,13 @@ def sanitize_key(key):
     # Replace invalid characters like $, and any character that's not alphanumeric or underscore, with an underscore
     return re.sub(r'[^a-zA-Z0-9_]', '_', key)
 
+# Line breaks in values, e.g. of multi-line SQL statements, as character references
+LINE_BREAKS = {"\n": "&#10;", "\r": "&#13;"}
+
 # Function to sanitize values for XML
 def sanitize_value(value):
-    # Escape common XML special characters
-    return saxutils.escape(value).replace("'", "&apos;").replace('"', "&quot;")
+    # Escape common XML special characters, and line breaks so every event stays on one line
+    return saxutils.escape(value, LINE_BREAKS).replace("'", "&apos;").replace('"', "&quot;")
 
 # Function to convert snake_case to Camel_Hump_Case
 def to_camel_hump_case(snake_str):